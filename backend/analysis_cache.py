@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))
+
+# Bump when the analysis output changes so persisted results are not reused
+ANALYSIS_SCHEMA_VERSION = 4
+
+def content_hash(components: List[Dict], relationships: List[Dict]) -> str:
+    """Canonical SHA-256 of a map's content, independent of list order."""
+    canonical = {
+        "components": sorted(components, key=lambda c: c['id']),
+        "relationships": sorted(relationships, key=lambda r: (r['source'], r['target'], r['type']))
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """Thread-safe LRU of analysis results keyed by content hash.
+
+    Each entry also keeps the map's relationships, which the analysis itself
+    does not echo back, so it can serve as the base of an incremental update.
+    """
+
+    def __init__(self, max_size: int = ANALYSIS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persisted_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached analysis and mark it recently used, counting the hit or miss."""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Dict, List[Dict]]]:
+        """Like get, but return the (analysis, relationships) pair."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """Return the cached analysis without touching recency or counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def put(self, key: str, analysis: Dict, relationships: List[Dict]) -> None:
+        with self._lock:
+            self._entries[key] = (analysis, relationships)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_persisted_hit(self) -> None:
+        """Count a miss that was answered from map_versions.analysis."""
+        with self._lock:
+            self.persisted_hits += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "persisted_hits": self.persisted_hits,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+cache = AnalysisCache()
@@ -0,0 +1,131 @@
+"""Keyword scoring speed: one pass per context versus per-keyword substring scans.
+
+Builds a ~1 MB synthetic document, cuts it into component mention contexts the
+way TextProcessor does (the mention plus five tokens either side), and scores
+them with KeywordScorer and with the previous substring implementation. Run
+from the backend directory:
+
+    python benchmarks/bench_keyword_scoring.py --size-mb 1
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_processor import KeywordScorer
+
+EVOLUTION_KEYWORDS = {
+    'genesis': ['new', 'novel', 'innovative', 'emerging', 'undefined', 'experimental', 'research'],
+    'custom': ['custom', 'built', 'specific', 'tailored', 'specialized', 'bespoke'],
+    'product': ['product', 'standardized', 'mature', 'established', 'stable'],
+    'commodity': ['commodity', 'utility', 'standard', 'common', 'generic', 'widespread']
+}
+VALUE_KEYWORDS = {
+    'high': ['critical', 'essential', 'core', 'key', 'vital', 'strategic', 'crucial'],
+    'medium': ['important', 'necessary', 'needed', 'useful', 'valuable'],
+    'low': ['supporting', 'auxiliary', 'optional', 'supplementary', 'peripheral']
+}
+EVOLUTION_SCORES = {'genesis': 0.1, 'custom': 0.4, 'product': 0.7, 'commodity': 0.9}
+VALUE_SCORES = {'high': 0.9, 'medium': 0.5, 'low': 0.2}
+MATURITY_INDICATORS = {'new': 0.1, 'developing': 0.3, 'stable': 0.6, 'mature': 0.8, 'legacy': 0.9}
+
+FILLER = (
+    "the a an and or of to in on for with by from our their this that which is are was be "
+    "platform team service customer data pipeline cluster network storage compute billing "
+    "payments identity search analytics reporting dashboard mobile web api gateway queue "
+    "cache database warehouse model training inference deployment monitoring logging "
+    "runs serves handles connects stores processes sends receives builds manages scales "
+    "renewal keyboard keynote newsletter corestore products standards customized utilities"
+).split()
+
+# Share of words drawn from the keyword lists rather than the filler
+KEYWORD_DENSITY = 0.08
+
+def substring_scores(contexts):
+    """The previous implementation: three passes of `keyword in context` per context."""
+    def average(scores):
+        return sum(scores) / len(scores) if scores else 0.5
+
+    evolution, value, maturity = [], [], []
+    for context in contexts:
+        context = context.lower()
+        for stage, keywords in EVOLUTION_KEYWORDS.items():
+            if any(keyword in context for keyword in keywords):
+                evolution.append(EVOLUTION_SCORES[stage])
+    for context in contexts:
+        context = context.lower()
+        for level, keywords in VALUE_KEYWORDS.items():
+            if any(keyword in context for keyword in keywords):
+                value.append(VALUE_SCORES[level])
+    for context in contexts:
+        context = context.lower()
+        for indicator, score in MATURITY_INDICATORS.items():
+            if indicator in context:
+                maturity.append(score)
+    return [average(evolution), average(value), average(maturity)]
+
+def make_document(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    keywords = [
+        keyword
+        for keywords in list(EVOLUTION_KEYWORDS.values()) + list(VALUE_KEYWORDS.values())
+        for keyword in keywords
+    ] + list(MATURITY_INDICATORS)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(keywords if rng.random() < KEYWORD_DENSITY else FILLER)
+        words.append(word.capitalize() if rng.random() < 0.1 else word)
+        length += len(word) + 1
+    return words
+
+def make_mentions(words, mentions_per_component: int = 10):
+    """Context windows around every fourth word, grouped into components."""
+    contexts = [" ".join(words[max(0, i - 5):i + 6]) for i in range(0, len(words), 4)]
+    return [contexts[i:i + mentions_per_component] for i in range(0, len(contexts), mentions_per_component)]
+
+def best_of(runs, fn, groups):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        results = [fn(contexts) for contexts in groups]
+        timings.append(time.perf_counter() - started)
+    return min(timings), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=1.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    words = make_document(int(args.size_mb * 1024 * 1024))
+    groups = make_mentions(words)
+    scorer = KeywordScorer([
+        {stage: (keywords, EVOLUTION_SCORES[stage]) for stage, keywords in EVOLUTION_KEYWORDS.items()},
+        {level: (keywords, VALUE_SCORES[level]) for level, keywords in VALUE_KEYWORDS.items()},
+        {indicator: ([indicator], score) for indicator, score in MATURITY_INDICATORS.items()}
+    ])
+
+    old_seconds, old_results = best_of(args.runs, substring_scores, groups)
+    new_seconds, new_results = best_of(args.runs, scorer.score, groups)
+    print(json.dumps({
+        "document_bytes": sum(len(word) + 1 for word in words),
+        "contexts": sum(len(contexts) for contexts in groups),
+        "components": len(groups),
+        "substring_seconds": round(old_seconds, 3),
+        "single_pass_seconds": round(new_seconds, 3),
+        "speedup": round(old_seconds / new_seconds, 1),
+        # Differences come from substring false hits such as "new" in "renewal"
+        "components_scored_differently": sum(
+            not all(math.isclose(a, b) for a, b in zip(old, new))
+            for old, new in zip(old_results, new_results)
+        )
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
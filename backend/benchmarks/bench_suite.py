@@ -0,0 +1,215 @@
+"""Latency, throughput and peak memory of the backend hot paths.
+
+Times text extraction, map analysis and the version endpoints on synthetic
+maps and text, and writes the results as JSON so runs on different commits
+can be compared. Runs offline against a throwaway SQLite database. Run from
+the backend directory:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --baseline before.json --output after.json
+
+Text extraction needs the spaCy model installed; without it that stage is
+reported as skipped.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before database is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import numpy as np
+from fastapi.testclient import TestClient
+from database import engine
+from main import app
+from map_graph import MapGraph
+from models import MapVersion
+from strategic_analyzer import StrategicAnalyzer
+import map_analysis
+import migrations
+from synthetic import make_map, make_text, move_components
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int) -> Dict:
+    """Time ``iterations`` calls of fn, then trace the memory of one more."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    # Traced separately: tracemalloc slows allocation-heavy code down several times
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    return {
+        "iterations": iterations,
+        "p50_ms": round(p50, 3),
+        "p90_ms": round(p90, 3),
+        "p99_ms": round(p99, 3),
+        "mean_ms": round(elapsed / iterations * 1000, 3),
+        "ops_per_second": round(iterations / elapsed, 2),
+        "peak_memory_kib": round(peak / 1024, 1)
+    }
+
+def bench_text(sizes: List[int], iterations: int, warmup: int) -> Dict:
+    try:
+        from text_processor import TextProcessor
+        processor = TextProcessor()
+    except OSError as e:
+        return {f"extract_text/chars={size}": {"skipped": str(e)} for size in sizes}
+    results = {}
+    for size in sizes:
+        text = make_text(size)
+        results[f"extract_text/chars={size}"] = measure(lambda: processor.process(text), iterations, warmup)
+    return results
+
+def bench_analysis(sizes: List[int], density: float, cycle_ratio: float, iterations: int, warmup: int) -> Dict:
+    results = {}
+    for size in sizes:
+        components, relationships = make_map(size, density, cycle_ratio)
+        version = MapVersion(components=components, relationships=relationships)
+
+        def strategic():
+            graph = MapGraph.from_models(version.components, version.relationships)
+            return StrategicAnalyzer().analyze_map(graph)
+
+        def relationships_only():
+            return map_analysis.analyze_relationships(MapGraph.from_models(version.components, version.relationships))
+
+        results[f"analyze_map/n={size}"] = measure(lambda: map_analysis.analyze_map(version), iterations, warmup)
+        results[f"strategic_analyze/n={size}"] = measure(strategic, iterations, warmup)
+        results[f"analyze_relationships/n={size}"] = measure(relationships_only, iterations, warmup)
+    return results
+
+def bench_versions(sizes: List[int], density: float, history: int, iterations: int, warmup: int) -> Dict:
+    migrations.init_schema(engine)
+    # Outside a `with` block the app skips its lifespan, so no CPU workers are started
+    client = TestClient(app)
+
+    def check(response):
+        response.raise_for_status()
+        return response
+
+    results = {}
+    for size in sizes:
+        components, relationships = make_map(size, density, 0.0)
+        map_id = check(client.post("/maps/", json={
+            "name": f"bench-{size}",
+            "description": "benchmark",
+            "owner_id": 1,
+            "current_version": {"components": components, "relationships": relationships, "description": ""}
+        })).json()["id"]
+        steps = itertools.count()
+
+        def create():
+            step = next(steps)
+            return check(client.post(f"/maps/{map_id}/versions", json={
+                "components": move_components(components, seed=step),
+                "relationships": relationships
+            }))
+
+        for _ in range(history - 1):
+            create()
+        latest = history
+        results[f"version_create/n={size}"] = measure(create, iterations, warmup)
+        latest += iterations + warmup + 1
+
+        versions = itertools.cycle(range(1, latest + 1, max(1, latest // 10)))
+        results[f"version_get/n={size}"] = measure(
+            lambda: check(client.get(f"/maps/{map_id}/versions/{next(versions)}")), iterations, warmup
+        )
+        results[f"version_diff/n={size}"] = measure(
+            lambda: check(client.get(f"/maps/{map_id}/diff", params={"from": 1, "to": latest})), iterations, warmup
+        )
+        results[f"version_list/n={size}"] = measure(
+            lambda: check(client.get(f"/maps/{map_id}/versions", params={"limit": 50})), iterations, warmup
+        )
+        results[f"version_trajectories/n={size}"] = measure(
+            lambda: check(client.get(f"/maps/{map_id}/trajectories")), iterations, warmup
+        )
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: Dict, baseline: Dict) -> Dict:
+    """p50 latency of each stage relative to the baseline run; above 1 is slower."""
+    ratios = {}
+    for stage, result in results.items():
+        before = baseline.get("stages", {}).get(stage, {})
+        if "p50_ms" in result and before.get("p50_ms"):
+            ratios[stage] = round(result["p50_ms"] / before["p50_ms"], 2)
+    return ratios
+
+def sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default="text,analysis,versions", help="comma-separated subset of text, analysis, versions")
+    parser.add_argument("--map-sizes", type=sizes, default=[100, 1000], help="components per map, comma-separated")
+    parser.add_argument("--density", type=float, default=0.005, help="share of possible edges present")
+    parser.add_argument("--cycle-ratio", type=float, default=0.05, help="share of edges pointing up the value chain")
+    parser.add_argument("--text-sizes", type=sizes, default=[10_000, 100_000], help="corpus sizes in characters, comma-separated")
+    parser.add_argument("--history", type=int, default=50, help="versions saved before timing the version endpoints")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    stages = set(args.stages.split(","))
+    results = {}
+    if "text" in stages:
+        results.update(bench_text(args.text_sizes, args.iterations, args.warmup))
+    if "analysis" in stages:
+        results.update(bench_analysis(args.map_sizes, args.density, args.cycle_ratio, args.iterations, args.warmup))
+    if "versions" in stages:
+        results.update(bench_versions(args.map_sizes, args.density, args.history, args.iterations, args.warmup))
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "stages": results
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["p50_ratio_to_baseline"] = compare(results, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        if args.baseline:
+            print(json.dumps(report["p50_ratio_to_baseline"], indent=2))
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
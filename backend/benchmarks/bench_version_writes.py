@@ -0,0 +1,142 @@
+"""Throughput of concurrent version saves.
+
+Runs the same number of saves with one writer, then with many parallel
+writers on a single hot map and spread across several maps. Checks that
+every map's versions got distinct, contiguous numbers and that parallel
+throughput relative to the serial run meets a threshold. Run from the
+backend directory:
+
+    python benchmarks/bench_version_writes.py --database-url postgresql://...
+
+Defaults to a throwaway SQLite file. SQLite serializes all writers at the
+database level, so parallel saves cannot beat serial ones there and the
+thresholds are only checked when given explicitly; point it at PostgreSQL to
+measure row-lock contention realistically.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from database import make_engine
+from models import MapDB, MapVersionDB
+import migrations
+import version_store
+
+# Parallel saves per second relative to serial, enforced on PostgreSQL by default.
+# Saves to one map serialize on its row lock, so the hot map only has to hold up;
+# saves to different maps should scale.
+MIN_HOT_RATIO = 0.7
+MIN_SPREAD_RATIO = 1.5
+
+def make_content(step: int, size: int):
+    components = [
+        {"id": f"c{i}", "name": f"Component {i}", "x": ((i + step) % 100) / 100, "y": (i % 10) / 10, "description": None}
+        for i in range(size)
+    ]
+    relationships = [
+        {"source": f"c{i}", "target": f"c{i + 1}", "type": "depends_on"}
+        for i in range(size - 1)
+    ]
+    return components, relationships
+
+def run(Session, writers: int, saves: int, size: int, maps: int = 1) -> dict:
+    """Make ``saves`` saves from ``writers`` threads, round-robin over ``maps`` new maps."""
+    with Session() as db:
+        db_maps = [MapDB(name=f"bench-{writers}-{maps}-{i}", owner_id="bench") for i in range(maps)]
+        db.add_all(db_maps)
+        db.commit()
+        map_ids = [db_map.id for db_map in db_maps]
+
+    def save(step: int) -> float:
+        components, relationships = make_content(step, size)
+        started = time.perf_counter()
+        with Session() as db:
+            version_store.create_version(db, map_ids[step % maps], components, relationships)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        latencies = sorted(pool.map(save, range(saves)))
+    elapsed = time.perf_counter() - started
+
+    contiguous = True
+    with Session() as db:
+        for i, map_id in enumerate(map_ids):
+            expected = len(range(i, saves, maps))
+            versions = [
+                v for (v,) in db.query(MapVersionDB.version)
+                .filter(MapVersionDB.map_id == map_id)
+                .order_by(MapVersionDB.version)
+            ]
+            latest = db.query(MapDB.latest_version).filter(MapDB.id == map_id).scalar()
+            rows = db.query(func.count(MapVersionDB.id)).filter(MapVersionDB.map_id == map_id).scalar()
+            contiguous = contiguous and versions == list(range(1, expected + 1)) and latest == expected and rows == expected
+
+    return {
+        "writers": writers,
+        "maps": maps,
+        "saves": saves,
+        "seconds": round(elapsed, 3),
+        "saves_per_second": round(saves / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "contiguous": contiguous
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url")
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--maps", type=int, default=10, help="maps the spread run saves to")
+    parser.add_argument("--saves", type=int, default=500)
+    parser.add_argument("--components", type=int, default=50)
+    parser.add_argument("--min-hot-ratio", type=float, help=f"default {MIN_HOT_RATIO} on PostgreSQL, unchecked on SQLite")
+    parser.add_argument("--min-spread-ratio", type=float, help=f"default {MIN_SPREAD_RATIO} on PostgreSQL, unchecked on SQLite")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = make_engine(url, pool_size=args.writers, max_overflow=0)
+    migrations.init_schema(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    serial = run(Session, 1, args.saves, args.components)
+    hot = run(Session, args.writers, args.saves, args.components)
+    spread = run(Session, args.writers, args.saves, args.components, args.maps)
+
+    sqlite = engine.dialect.name == "sqlite"
+    minimums = {
+        "hot": args.min_hot_ratio if args.min_hot_ratio is not None or sqlite else MIN_HOT_RATIO,
+        "spread": args.min_spread_ratio if args.min_spread_ratio is not None or sqlite else MIN_SPREAD_RATIO
+    }
+    ratios = {
+        name: round(result["saves_per_second"] / serial["saves_per_second"], 2)
+        for name, result in (("hot", hot), ("spread", spread))
+    }
+    failures = [
+        f"{name} throughput ratio {ratios[name]} is below {minimum}"
+        for name, minimum in minimums.items()
+        if minimum is not None and ratios[name] < minimum
+    ]
+    print(json.dumps({
+        "database": engine.dialect.name,
+        "serial": serial,
+        "hot_map": hot,
+        "spread": spread,
+        "throughput_ratio": ratios,
+        "min_throughput_ratio": minimums
+    }, indent=2))
+    if not all(result["contiguous"] for result in (serial, hot, spread)):
+        failures.append("version numbers are not unique and contiguous")
+    if failures:
+        sys.exit("; ".join(failures))
+
+if __name__ == "__main__":
+    main()
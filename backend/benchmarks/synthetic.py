@@ -0,0 +1,76 @@
+"""Seeded generators of synthetic maps and text corpora for the benchmarks."""
+import random
+from typing import Dict, List, Tuple
+
+NOUNS = (
+    "platform service customer pipeline cluster network storage compute billing payments "
+    "identity search analytics reporting dashboard gateway queue cache database warehouse "
+    "model training inference deployment monitoring logging ledger catalog checkout inventory"
+).split()
+ADJECTIVES = (
+    "new novel emerging custom bespoke tailored standard generic commodity mature stable "
+    "legacy critical essential core strategic important useful optional supporting developing"
+).split()
+VERBS = (
+    "depends on", "requires", "uses", "relies on", "provides", "supports", "enables",
+    "serves", "contains", "includes", "is part of"
+)
+FILLER = "the a our their this each every".split()
+
+def make_map(size: int, density: float = 0.01, cycle_ratio: float = 0.05, seed: int = 0) -> Tuple[List[Dict], List[Dict]]:
+    """A map of ``size`` components as (components, relationships) dicts.
+
+    About ``density * size * (size - 1)`` distinct edges are drawn. Edges
+    normally point from higher to lower value, like a value chain; a
+    ``cycle_ratio`` share point the other way and so close cycles.
+    """
+    rng = random.Random(seed)
+    components = [
+        {
+            "id": f"c{i}",
+            "name": f"Component {i}",
+            "x": rng.random(),
+            "y": rng.random(),
+            "description": None
+        }
+        for i in range(size)
+    ]
+    # Index order follows value, highest first
+    order = sorted(range(size), key=lambda i: -components[i]["y"])
+
+    # Without reversed edges only one direction of each pair is available
+    possible = size * (size - 1) if cycle_ratio > 0 else size * (size - 1) // 2
+    edge_count = min(int(density * size * (size - 1)), possible)
+    edges = set()
+    while len(edges) < edge_count:
+        a, b = sorted(rng.sample(range(size), 2))
+        if rng.random() < cycle_ratio:
+            a, b = b, a
+        edges.add((order[a], order[b]))
+    relationships = [
+        {"source": f"c{source}", "target": f"c{target}", "type": "depends_on"}
+        for source, target in sorted(edges)
+    ]
+    return components, relationships
+
+def move_components(components: List[Dict], share: float = 0.1, seed: int = 0) -> List[Dict]:
+    """A copy of ``components`` with a ``share`` of them moved along evolution."""
+    rng = random.Random(seed)
+    moved = [dict(component) for component in components]
+    for component in rng.sample(moved, int(len(moved) * share)):
+        component["x"] = min(1.0, max(0.0, component["x"] + rng.uniform(-0.1, 0.1)))
+    return moved
+
+def make_text(size: int, seed: int = 0) -> str:
+    """About ``size`` characters of prose naming components and how they relate."""
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < size:
+        sentence = (
+            f"{rng.choice(FILLER).capitalize()} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} "
+            f"{rng.choice(VERBS)} {rng.choice(FILLER)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}."
+        )
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
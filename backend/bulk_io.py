@@ -0,0 +1,297 @@
+"""Streaming NDJSON import and export of maps with their full version history.
+
+Each line is one JSON record, either a map or one of its versions:
+
+    {"type": "map", "id": 7, "name": "...", "description": "...", "owner_id": "1", "created_at": "..."}
+    {"type": "version", "map_id": 7, "version": 1, "components": [...], "relationships": [...], "comment": "..."}
+
+``id`` and ``map_id`` are only used to link versions to their map within the
+file; imported maps get new ids. A version without ``map_id`` belongs to the
+map line before it. A map's versions must appear in increasing version
+order, though not necessarily right after it. Versions carry their full
+content regardless of how they are stored, and are delta-encoded again on
+import when they follow their predecessor in the file. Exported
+``content_hash`` and ``analysis`` fields are ignored on import: the hash is
+recomputed from the content and analyses are redone on demand, so a line
+cannot plant an analysis that is then served for matching content.
+"""
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from analysis_cache import content_hash
+from models import MapDB, MapVersion, MapVersionDB
+import component_index
+import version_store
+
+# Rows per executemany batch on import and per server-side cursor fetch on export
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MAP_FIELDS = ("name", "description", "owner_id")
+DATETIME_FIELDS = ("created_at", "updated_at")
+
+class ImportFailed(ValueError):
+    """Raised for a malformed or inconsistent line; nothing from the import is kept."""
+
+    def __init__(self, line_no: int, message: str):
+        super().__init__(f"line {line_no}: {message}")
+        self.line_no = line_no
+
+def _encode(record: Dict) -> str:
+    return json.dumps(record, separators=(",", ":"), default=_json_default) + "\n"
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def export_ndjson(session_factory: Callable[[], Session], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Yield every map followed by its versions, in batches of NDJSON lines.
+
+    Maps and versions are read through two server-side cursors in id and
+    (map_id, version) order and merged, so memory holds one fetch batch and
+    the current version's content rather than the whole catalogue.
+    """
+    with session_factory() as db:
+        maps = db.execute(
+            select(MapDB.id, MapDB.name, MapDB.description, MapDB.owner_id, MapDB.created_at, MapDB.updated_at)
+            .order_by(MapDB.id)
+            .execution_options(yield_per=batch_size)
+        )
+        versions = db.execute(
+            select(
+                MapVersionDB.map_id,
+                MapVersionDB.version,
+                MapVersionDB.components,
+                MapVersionDB.relationships,
+                MapVersionDB.delta,
+                MapVersionDB.content_hash,
+                MapVersionDB.analysis,
+                MapVersionDB.comment,
+                MapVersionDB.created_at
+            )
+            .order_by(MapVersionDB.map_id, MapVersionDB.version)
+            .execution_options(yield_per=batch_size)
+        )
+        pending = next(versions, None)
+        lines = []
+        for map_row in maps:
+            lines.append(_encode({"type": "map", **map_row._asdict()}))
+            # Skip versions whose map no longer exists
+            while pending is not None and pending.map_id < map_row.id:
+                pending = next(versions, None)
+            content = None
+            while pending is not None and pending.map_id == map_row.id:
+                if pending.delta is None:
+                    content = (pending.components or [], pending.relationships or [])
+                else:
+                    content = version_store.apply_delta(*content, pending.delta)
+                lines.append(_encode({
+                    "type": "version",
+                    "map_id": pending.map_id,
+                    "version": pending.version,
+                    "components": content[0],
+                    "relationships": content[1],
+                    "content_hash": pending.content_hash,
+                    "analysis": pending.analysis,
+                    "comment": pending.comment,
+                    "created_at": pending.created_at
+                }))
+                if len(lines) >= batch_size:
+                    yield "".join(lines)
+                    lines = []
+                pending = next(versions, None)
+            if len(lines) >= batch_size:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+
+async def iter_line_chunks(stream: AsyncIterable[bytes], chunk_size: int) -> AsyncIterator[List[Tuple[int, bytes]]]:
+    """Split a byte stream into lists of up to ``chunk_size`` numbered, non-blank lines."""
+    parts = []
+    chunk = []
+    line_no = 0
+    async for data in stream:
+        if b"\n" not in data:
+            parts.append(data)
+            continue
+        *complete, rest = b"".join(parts + [data]).split(b"\n")
+        parts = [rest]
+        for line in complete:
+            line_no += 1
+            if line.strip():
+                chunk.append((line_no, line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    buffer = b"".join(parts)
+    if buffer.strip():
+        chunk.append((line_no + 1, buffer))
+    if chunk:
+        yield chunk
+
+def _parse_datetimes(record: Dict, line_no: int) -> Dict:
+    values = {}
+    for field in DATETIME_FIELDS:
+        if record.get(field):
+            try:
+                values[field] = datetime.fromisoformat(record[field])
+            except (TypeError, ValueError):
+                raise ImportFailed(line_no, f"invalid {field}")
+    return values
+
+class Importer:
+    """Bulk-inserts NDJSON records into one transaction, a chunk at a time.
+
+    Maps are inserted with a single executemany ... RETURNING per chunk to
+    learn their new ids, versions with plain executemany. The caller commits
+    or rolls back the session.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.map_ids: Dict = {}
+        self.seen_map_ids = set()
+        self.last_source_id = None
+        self.pending_maps: List[Tuple] = []
+        self.pending_versions: List[Tuple] = []
+        self.latest_versions: Dict = {}
+        self.touched_maps = set()
+        # Content of the last imported version, to delta-encode its successor
+        self.previous: Optional[Tuple] = None
+        self.index = component_index.IndexBuffer()
+        self.maps = 0
+        self.versions = 0
+
+    def add_lines(self, lines: List[Tuple[int, bytes]]) -> None:
+        """Parse and insert one chunk of lines."""
+        for line_no, line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ImportFailed(line_no, "not valid JSON")
+            if not isinstance(record, dict):
+                raise ImportFailed(line_no, "expected a JSON object")
+            if record.get("type") == "map":
+                self._add_map(record, line_no)
+            elif record.get("type") == "version":
+                self._add_version(record, line_no)
+            else:
+                raise ImportFailed(line_no, "type must be 'map' or 'version'")
+        self._flush_maps()
+        self._flush_versions()
+
+    def finish(self) -> Dict:
+        """Insert anything still pending and return the import totals."""
+        self._flush_maps()
+        self._flush_versions()
+        return {"maps": self.maps, "versions": self.versions}
+
+    def _add_map(self, record: Dict, line_no: int) -> None:
+        source_id = record.get("id", ("line", line_no))
+        if not isinstance(source_id, (str, int, tuple)):
+            raise ImportFailed(line_no, "map id must be a string or an integer")
+        if source_id in self.seen_map_ids:
+            raise ImportFailed(line_no, f"duplicate map id {source_id!r}")
+        self.seen_map_ids.add(source_id)
+        values = {field: record.get(field) for field in MAP_FIELDS}
+        if values["owner_id"] is not None:
+            values["owner_id"] = str(values["owner_id"])
+        values.update(_parse_datetimes(record, line_no))
+        self.pending_maps.append((source_id, values))
+        self.last_source_id = source_id
+
+    def _add_version(self, record: Dict, line_no: int) -> None:
+        source_id = record.get("map_id", self.last_source_id)
+        if not isinstance(source_id, (str, int, tuple)):
+            raise ImportFailed(line_no, "map_id must be a string or an integer")
+        if source_id not in self.seen_map_ids:
+            raise ImportFailed(line_no, f"unknown map id {source_id!r}")
+        version_num = record.get("version")
+        if not isinstance(version_num, int) or version_num < 1:
+            raise ImportFailed(line_no, "version must be a positive integer")
+        # The component index assumes each map's history arrives in order
+        last_version = self.latest_versions.get(source_id, 0)
+        if version_num <= last_version:
+            raise ImportFailed(line_no, f"version {version_num} does not follow version {last_version} of map {source_id!r}")
+        try:
+            version = MapVersion(
+                components=record.get("components", []),
+                relationships=record.get("relationships", []),
+                comment=record.get("comment")
+            ).dict()
+        except ValidationError as e:
+            raise ImportFailed(line_no, "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+            ))
+
+        components = version["components"]
+        relationships = version["relationships"]
+        previous = None
+        if self.previous and self.previous[:2] == (source_id, version_num - 1):
+            previous = self.previous[2]
+        fields = {
+            "content_hash": content_hash(components, relationships),
+            "comment": version["comment"] or f"Version {version_num}",
+            **_parse_datetimes(record, line_no)
+        }
+        # The map's new id is filled in at flush time, once its chunk of maps is inserted
+        self.pending_versions.append((
+            source_id,
+            version_store.version_values(None, version_num, components, relationships, previous, **fields)
+        ))
+        self.index.add_version(
+            source_id,
+            version_num,
+            previous,
+            (components, relationships),
+            has_history=source_id in self.latest_versions
+        )
+        self.previous = (source_id, version_num, (components, relationships))
+        self.latest_versions[source_id] = version_num
+        self.touched_maps.add(source_id)
+
+    def _flush_maps(self) -> None:
+        if not self.pending_maps:
+            return
+        # Rows with different columns cannot share one executemany
+        by_columns = defaultdict(list)
+        for source_id, values in self.pending_maps:
+            by_columns[tuple(sorted(values))].append((source_id, values))
+        for rows in by_columns.values():
+            new_ids = self.db.execute(
+                insert(MapDB).returning(MapDB.id, sort_by_parameter_order=True),
+                [values for _, values in rows]
+            ).scalars().all()
+            for (source_id, _), new_id in zip(rows, new_ids):
+                self.map_ids[source_id] = new_id
+        self.maps += len(self.pending_maps)
+        self.pending_maps = []
+
+    def _flush_versions(self) -> None:
+        if not self.pending_versions:
+            return
+        self._flush_maps()
+        by_columns = defaultdict(list)
+        for source_id, values in self.pending_versions:
+            values["map_id"] = self.map_ids[source_id]
+            by_columns[tuple(sorted(values))].append(values)
+        for rows in by_columns.values():
+            self.db.execute(insert(MapVersionDB), rows)
+        self.index.flush(self.db, self.map_ids)
+        self.db.execute(
+            update(MapDB),
+            [
+                {"id": self.map_ids[source_id], "latest_version": self.latest_versions[source_id]}
+                for source_id in self.touched_maps
+            ]
+        )
+        self.versions += len(self.pending_versions)
+        self.pending_versions = []
+        self.touched_maps = set()
@@ -0,0 +1,228 @@
+"""Normalized, indexed copy of map content for cross-map search.
+
+map_versions keeps content as JSON, mostly as deltas, which can only be
+searched by decoding every row. Each component state and each relationship is
+therefore also a row of map_components / map_edges, valid from the version
+that introduced it up to ``to_version``, the last version before it changed
+or was removed (NULL while current). A save writes only the rows that
+changed, so the tables grow with edits rather than with the number of
+versions.
+"""
+from typing import Callable, Dict, Hashable, List, Mapping, Optional, Tuple
+from sqlalchemy import bindparam, insert, tuple_, update
+from sqlalchemy.orm import Session
+from models import MapComponentDB, MapEdgeDB
+
+Content = Tuple[List[Dict], List[Dict]]
+
+COMPONENTS = MapComponentDB.__table__
+EDGES = MapEdgeDB.__table__
+
+def _component_key(component: Dict) -> str:
+    return component["id"]
+
+def _component_state(component: Dict) -> Tuple:
+    return component["name"], component["x"], component["y"]
+
+def _edge_key(relationship: Dict) -> Tuple[str, str, str]:
+    return relationship["source"], relationship["target"], relationship["type"]
+
+def _component_row(version_num: int, component: Dict) -> Dict:
+    return {
+        "component_id": component["id"],
+        "name": component["name"],
+        "name_lower": component["name"].lower(),
+        "x": component["x"],
+        "y": component["y"],
+        "from_version": version_num,
+        "to_version": None
+    }
+
+def _edge_row(version_num: int, relationship: Dict) -> Dict:
+    return {
+        "source": relationship["source"],
+        "target": relationship["target"],
+        "type": relationship["type"],
+        "from_version": version_num,
+        "to_version": None
+    }
+
+def changes(
+    previous: Optional[List[Dict]],
+    current: List[Dict],
+    key: Callable[[Dict], Hashable],
+    state: Optional[Callable[[Dict], Hashable]] = None
+) -> Tuple[List[Hashable], List[Dict]]:
+    """Keys whose row ends with the previous version, and items that need a new row.
+
+    An item needs a new row if its key is new or, with ``state``, if its
+    state differs from the previous version's. A repeated key counts once,
+    with its last occurrence.
+    """
+    before = {key(item): item for item in previous or ()}
+    after = {key(item): item for item in current}
+    closed = []
+    opened = []
+    for item_key, item in before.items():
+        new = after.get(item_key)
+        if new is None or (state is not None and state(new) != state(item)):
+            closed.append(item_key)
+    for item_key, item in after.items():
+        old = before.get(item_key)
+        if old is None or (state is not None and state(old) != state(item)):
+            opened.append(item)
+    return closed, opened
+
+def record_version(db: Session, map_id: int, version_num: int, previous: Optional[Content], content: Content) -> None:
+    """Index a newly written version in the caller's transaction.
+
+    ``previous`` is the content of version_num - 1, or None for a first
+    version. With version_num > 1 and no previous content, every current row
+    of the map is closed and the whole content indexed afresh.
+    """
+    components, relationships = content
+    if previous is None:
+        if version_num > 1:
+            for table in (COMPONENTS, EDGES):
+                db.execute(
+                    update(table)
+                    .where(table.c.map_id == map_id, table.c.to_version.is_(None))
+                    .values(to_version=version_num - 1)
+                )
+        previous = ([], [])
+
+    closed_components, opened_components = changes(previous[0], components, _component_key, _component_state)
+    closed_edges, opened_edges = changes(previous[1], relationships, _edge_key)
+    if closed_components:
+        db.execute(
+            update(COMPONENTS)
+            .where(
+                COMPONENTS.c.map_id == map_id,
+                COMPONENTS.c.component_id.in_(closed_components),
+                COMPONENTS.c.to_version.is_(None)
+            )
+            .values(to_version=version_num - 1)
+        )
+    if closed_edges:
+        db.execute(
+            update(EDGES)
+            .where(
+                EDGES.c.map_id == map_id,
+                tuple_(EDGES.c.source, EDGES.c.target, EDGES.c.type).in_(closed_edges),
+                EDGES.c.to_version.is_(None)
+            )
+            .values(to_version=version_num - 1)
+        )
+    if opened_components:
+        db.execute(insert(COMPONENTS), [
+            {"map_id": map_id, **_component_row(version_num, c)} for c in opened_components
+        ])
+    if opened_edges:
+        db.execute(insert(EDGES), [
+            {"map_id": map_id, **_edge_row(version_num, r)} for r in opened_edges
+        ])
+
+class IndexBuffer:
+    """Index rows for a stream of new versions, written in batches.
+
+    Used by bulk import and backfill. Versions are added in order per map,
+    keyed by any source id that ``flush`` can map to a database map id. Rows
+    stay in memory until the next flush, so a row that ends before then is
+    inserted with its to_version rather than updated later.
+    """
+
+    def __init__(self):
+        # (table, source, key) -> (source, row) for rows not yet inserted and still current
+        self.open: Dict[Tuple, Tuple[Hashable, Dict]] = {}
+        self.finished: Dict[str, List[Tuple[Hashable, Dict]]] = {"components": [], "edges": []}
+        # Rows from an earlier flush that have since ended
+        self.closes: Dict[str, List[Tuple[Hashable, Hashable, int]]] = {"components": [], "edges": []}
+        self.source_closes: List[Tuple[Hashable, int]] = []
+
+    def add_version(self, source: Hashable, version_num: int, previous: Optional[Content], content: Content, has_history: bool = False) -> None:
+        """Index one version; ``previous`` as for record_version.
+
+        Set ``has_history`` when earlier versions of the map were indexed
+        but ``previous`` is not known, so their current rows get closed.
+        """
+        components, relationships = content
+        if previous is None:
+            if has_history:
+                self._close_source(source, version_num - 1)
+            previous = ([], [])
+        closed_components, opened_components = changes(previous[0], components, _component_key, _component_state)
+        closed_edges, opened_edges = changes(previous[1], relationships, _edge_key)
+        for key in closed_components:
+            self._close("components", source, key, version_num - 1)
+        for key in closed_edges:
+            self._close("edges", source, key, version_num - 1)
+        for component in opened_components:
+            self.open[("components", source, component["id"])] = (source, _component_row(version_num, component))
+        for relationship in opened_edges:
+            self.open[("edges", source, _edge_key(relationship))] = (source, _edge_row(version_num, relationship))
+
+    def _close(self, table: str, source: Hashable, key: Hashable, to_version: int) -> None:
+        entry = self.open.pop((table, source, key), None)
+        if entry is None:
+            self.closes[table].append((source, key, to_version))
+        else:
+            entry[1]["to_version"] = to_version
+            self.finished[table].append(entry)
+
+    def _close_source(self, source: Hashable, to_version: int) -> None:
+        for open_key in [open_key for open_key in self.open if open_key[1] == source]:
+            self._close(open_key[0], source, open_key[2], to_version)
+        self.source_closes.append((source, to_version))
+
+    def flush(self, db: Session, map_ids: Mapping[Hashable, int]) -> None:
+        """Write everything buffered so far."""
+        # Close rows of earlier flushes before inserting their successors
+        for source, to_version in self.source_closes:
+            for table in (COMPONENTS, EDGES):
+                db.execute(
+                    update(table)
+                    .where(table.c.map_id == map_ids[source], table.c.to_version.is_(None))
+                    .values(to_version=to_version)
+                )
+        if self.closes["components"]:
+            db.execute(
+                update(COMPONENTS)
+                .where(
+                    COMPONENTS.c.map_id == bindparam("b_map_id"),
+                    COMPONENTS.c.component_id == bindparam("b_component_id"),
+                    COMPONENTS.c.to_version.is_(None)
+                )
+                .values(to_version=bindparam("b_to_version")),
+                [
+                    {"b_map_id": map_ids[source], "b_component_id": key, "b_to_version": to_version}
+                    for source, key, to_version in self.closes["components"]
+                ]
+            )
+        if self.closes["edges"]:
+            db.execute(
+                update(EDGES)
+                .where(
+                    EDGES.c.map_id == bindparam("b_map_id"),
+                    EDGES.c.source == bindparam("b_source"),
+                    EDGES.c.target == bindparam("b_target"),
+                    EDGES.c.type == bindparam("b_type"),
+                    EDGES.c.to_version.is_(None)
+                )
+                .values(to_version=bindparam("b_to_version")),
+                [
+                    {"b_map_id": map_ids[source], "b_source": key[0], "b_target": key[1], "b_type": key[2], "b_to_version": to_version}
+                    for source, key, to_version in self.closes["edges"]
+                ]
+            )
+
+        rows = {table: list(entries) for table, entries in self.finished.items()}
+        for (table, _, _), entry in self.open.items():
+            rows[table].append(entry)
+        for table, entries in ((COMPONENTS, rows["components"]), (EDGES, rows["edges"])):
+            if entries:
+                db.execute(insert(table), [{"map_id": map_ids[source], **row} for source, row in entries])
+
+        self.open = {}
+        self.finished = {"components": [], "edges": []}
+        self.closes = {"components": [], "edges": []}
+        self.source_closes = []
@@ -1,9 +1,60 @@
+import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import instrumentation
 
-DATABASE_URL = "postgresql://app_user:app_password@db:5432/app_db"
+# Use e.g. sqlite:///./wardley.db, or sqlite:// for a throwaway in-memory database
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://app_user:app_password@db:5432/app_db")
 
-engine = create_engine(DATABASE_URL)
+# Sized together to match workers.DB_THREADS so no request thread waits for a connection
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# PostgreSQL only; 0 disables the limit
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+def is_in_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:")
+
+def make_engine(url: str = DATABASE_URL, **options) -> Engine:
+    """Create an instrumented engine with the pool settings from the environment.
+
+    Keyword options override the environment, e.g. a larger pool_size for a
+    benchmark with many writers.
+    """
+    return instrumentation.instrument_engine(_create_engine(url, **options))
+
+def _create_engine(url: str, **options) -> Engine:
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+        if is_in_memory(url):
+            # One shared connection, otherwise every connection gets its own empty database
+            return create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+        return create_engine(
+            url,
+            connect_args={**connect_args, "timeout": 30},
+            **{"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, **options}
+        )
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        **{
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "pool_recycle": DB_POOL_RECYCLE,
+            **options
+        }
+    )
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
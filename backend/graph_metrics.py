@@ -0,0 +1,184 @@
+import os
+import random
+import time
+from collections import deque
+from functools import cached_property
+from typing import Dict, List, Optional
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+import instrumentation
+from map_graph import MapGraph
+
+# Graphs with more nodes than this use sampled (k-pivot) betweenness
+BETWEENNESS_APPROX_THRESHOLD = int(os.getenv("BETWEENNESS_APPROX_THRESHOLD", "200"))
+BETWEENNESS_SAMPLE_SIZE = int(os.getenv("BETWEENNESS_SAMPLE_SIZE", "64"))
+BETWEENNESS_SEED = 42
+
+PAGERANK_ALPHA = 0.85
+PAGERANK_MAX_ITER = 100
+PAGERANK_TOLERANCE = 1.0e-6
+
+# Bounds on elementary cycle enumeration inside circular-dependency clusters
+CYCLE_LIMIT = int(os.getenv("CYCLE_LIMIT", "100"))
+CYCLE_MAX_LENGTH = int(os.getenv("CYCLE_MAX_LENGTH", "10"))
+CYCLE_TIME_BUDGET = float(os.getenv("CYCLE_TIME_BUDGET", "0.5"))
+
+class GraphMetrics:
+    """Per-request graph metrics, each computed at most once.
+
+    Shared by map_analysis.analyze_relationships and StrategicAnalyzer so the
+    expensive centrality measures are not recomputed for every component.
+    Metrics run directly on the MapGraph's CSR arrays; results are keyed by
+    node id.
+    """
+
+    def __init__(
+        self,
+        graph: MapGraph,
+        approx_threshold: Optional[int] = None,
+        sample_size: Optional[int] = None
+    ):
+        self.graph = graph
+        self.approx_threshold = BETWEENNESS_APPROX_THRESHOLD if approx_threshold is None else approx_threshold
+        self.sample_size = BETWEENNESS_SAMPLE_SIZE if sample_size is None else sample_size
+
+    @property
+    def approximate(self) -> bool:
+        """Whether betweenness is estimated from a sample of pivot nodes."""
+        n = self.graph.node_count
+        return n > self.approx_threshold and self.sample_size < n
+
+    @cached_property
+    @instrumentation.timed("graph.betweenness")
+    def betweenness(self) -> Dict[str, float]:
+        """Normalized betweenness centrality (Brandes), as networkx computes it."""
+        n = self.graph.node_count
+        if self.approximate:
+            sources = random.Random(BETWEENNESS_SEED).sample(range(n), self.sample_size)
+        else:
+            sources = range(n)
+        successors = self.graph.successors
+        scores = [0.0] * n
+        for s in sources:
+            # Shortest-path counts by breadth-first search from s
+            order = []
+            predecessors = [[] for _ in range(n)]
+            sigma = [0.0] * n
+            distance = [-1] * n
+            sigma[s] = 1.0
+            distance[s] = 0
+            queue = deque([s])
+            while queue:
+                v = queue.popleft()
+                order.append(v)
+                next_distance = distance[v] + 1
+                for w in successors[v]:
+                    if distance[w] < 0:
+                        queue.append(w)
+                        distance[w] = next_distance
+                    if distance[w] == next_distance:
+                        sigma[w] += sigma[v]
+                        predecessors[w].append(v)
+            # Accumulate dependencies in reverse BFS order
+            delta = [0.0] * n
+            while order:
+                w = order.pop()
+                coeff = (1 + delta[w]) / sigma[w]
+                for v in predecessors[w]:
+                    delta[v] += sigma[v] * coeff
+                if w != s:
+                    scores[w] += delta[w]
+        if n > 2:
+            scale = 1 / ((n - 1) * (n - 2))
+            if self.approximate:
+                scale *= n / self.sample_size
+            scores = [score * scale for score in scores]
+        return self.graph.by_id(scores)
+
+    @cached_property
+    @instrumentation.timed("graph.pagerank")
+    def pagerank(self) -> Dict[str, float]:
+        """PageRank by power iteration over the sparse adjacency, as networkx computes it."""
+        n = self.graph.node_count
+        if n == 0:
+            return {}
+        out_degree = self.graph.out_degree.astype(float)
+        dangling = out_degree == 0
+        inverse_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+        transition = sparse.diags_array(inverse_degree) @ self.graph.adjacency
+        uniform = np.full(n, 1.0 / n)
+        ranks = uniform
+        for _ in range(PAGERANK_MAX_ITER):
+            previous = ranks
+            ranks = PAGERANK_ALPHA * (ranks @ transition + ranks[dangling].sum() * uniform) + (1 - PAGERANK_ALPHA) * uniform
+            if np.abs(ranks - previous).sum() < n * PAGERANK_TOLERANCE:
+                return self.graph.by_id(ranks)
+        raise nx.PowerIterationFailedConvergence(PAGERANK_MAX_ITER)
+
+    @cached_property
+    def density(self) -> float:
+        n = self.graph.node_count
+        return self.graph.edge_count / (n * (n - 1)) if n > 1 else 0
+
+    @cached_property
+    def isolates(self) -> List[str]:
+        """Nodes with no edges at all."""
+        isolated = np.flatnonzero((self.graph.in_degree + self.graph.out_degree) == 0)
+        return [self.graph.ids[i] for i in isolated.tolist()]
+
+    @cached_property
+    @instrumentation.timed("graph.cycles")
+    def cycles(self) -> Dict:
+        """Circular-dependency clusters and a bounded sample of their cycles.
+
+        Clusters are the strongly connected components that contain a cycle,
+        found in linear time. Elementary cycles are only enumerated inside
+        them, up to CYCLE_LIMIT cycles of at most CYCLE_MAX_LENGTH nodes
+        within CYCLE_TIME_BUDGET seconds; ``truncated`` is set when any of
+        these limits may have hidden a cycle.
+        """
+        graph = self.graph
+        members = {}
+        if graph.node_count:
+            _, labels = connected_components(graph.adjacency, directed=True, connection="strong")
+            for i, label in enumerate(labels.tolist()):
+                members.setdefault(label, []).append(i)
+        clusters = sorted(
+            (
+                nodes for nodes in members.values()
+                if len(nodes) > 1 or graph.has_edge(nodes[0], nodes[0])
+            ),
+            key=lambda nodes: (-len(nodes), min(graph.ids[i] for i in nodes))
+        )
+
+        cycles = []
+        truncated = False
+        deadline = time.monotonic() + CYCLE_TIME_BUDGET
+        for nodes in clusters:
+            # Stop before building the next cluster's subgraph, not just its enumeration
+            if len(cycles) >= CYCLE_LIMIT or time.monotonic() > deadline:
+                truncated = True
+                break
+            if len(nodes) > CYCLE_MAX_LENGTH:
+                truncated = True
+            # Only the cyclic clusters are handed to networkx
+            in_cluster = set(nodes)
+            subgraph = nx.DiGraph()
+            subgraph.add_nodes_from(graph.ids[i] for i in nodes)
+            subgraph.add_edges_from(
+                (graph.ids[v], graph.ids[w])
+                for v in nodes for w in graph.successors[v] if w in in_cluster
+            )
+            for cycle in nx.simple_cycles(subgraph, length_bound=CYCLE_MAX_LENGTH):
+                if len(cycles) >= CYCLE_LIMIT or time.monotonic() > deadline:
+                    truncated = True
+                    break
+                cycles.append(cycle)
+
+        return {
+            "clusters": [sorted(graph.ids[i] for i in nodes) for nodes in clusters],
+            "cycles": cycles,
+            "truncated": truncated
+        }
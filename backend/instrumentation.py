@@ -0,0 +1,208 @@
+"""Stage timers, Prometheus metrics and opt-in per-request profiling.
+
+Code marks its stages with ``stage``/``timed``. Every timing goes into the
+process-wide ``STAGE_SECONDS`` histogram and, during a request, into that
+request's list for the ``Server-Timing`` header. Work run in the CPU pool is
+wrapped by ``run_instrumented`` so its timings (and profile) travel back to
+the request that asked for it.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Off by default: a profile exposes code paths and costs a multiple of the request's time
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_HEADER = "X-Profile"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Thread-safe cumulative histogram with one series per label set."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            separator = "," if label_text else ""
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{label_text}{separator}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text}{separator}le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-2]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {values[-1]}")
+        return lines
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+STAGE_SECONDS = Histogram(
+    "wardley_stage_duration_seconds", "Time spent in each processing stage.", ("stage",)
+)
+REQUEST_SECONDS = Histogram(
+    "wardley_http_request_duration_seconds", "Time to response headers per route.", ("method", "route", "status")
+)
+
+# Set for the duration of a request by begin_request
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("stage_timings", default=None)
+_worker_profiles: ContextVar[Optional[List[Dict]]] = ContextVar("worker_profiles", default=None)
+
+def record(name: str, seconds: float) -> None:
+    """Count a finished stage in the metrics and the current request's timings."""
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+def timed(name: str) -> Callable:
+    """Decorator form of ``stage``."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_iter(name: str, iterable: Iterable) -> Iterator:
+    """Yield from iterable, timing each step spent producing an item."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record(name, time.perf_counter() - started)
+            return
+        record(name, time.perf_counter() - started)
+        yield item
+
+def instrument_engine(engine: Engine) -> Engine:
+    """Time every statement the engine executes as the ``db.query`` stage."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        record("db.query", time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    return engine
+
+def begin_request(profile: bool = False) -> List[Tuple[str, float]]:
+    """Start collecting the current request's stage timings, and worker profiles if asked."""
+    timings = []
+    _timings.set(timings)
+    _worker_profiles.set([] if profile else None)
+    return timings
+
+def profiling_workers() -> bool:
+    return _worker_profiles.get() is not None
+
+def run_instrumented(fn: Callable, profile: bool, *args: Any) -> Tuple[Any, List[Tuple[str, float]], Optional[Dict]]:
+    """Run fn in a worker process, returning its result, stage timings and profile."""
+    timings = begin_request()
+    if not profile:
+        return fn(*args), timings, None
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args)
+    profiler.create_stats()
+    return result, timings, profiler.stats
+
+def collect(timings: List[Tuple[str, float]], profile: Optional[Dict]) -> None:
+    """Merge what run_instrumented brought back from a worker into the current request."""
+    for name, seconds in timings:
+        record(name, seconds)
+    profiles = _worker_profiles.get()
+    if profile is not None and profiles is not None:
+        profiles.append(profile)
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value with the time per stage, summed over repeats."""
+    totals = defaultdict(float)
+    for name, seconds in timings:
+        totals[name] += seconds
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+class _LoadedStats:
+    """Adapter letting pstats.Stats read a profile that came back from a worker."""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+def profile_data(profiler: cProfile.Profile) -> bytes:
+    """The request's profile, worker profiles included, in pstats' file format."""
+    stats = pstats.Stats(profiler)
+    for worker_stats in _worker_profiles.get() or ():
+        stats.add(_LoadedStats(worker_stats))
+    # pstats files are the marshalled stats dict, as Stats.dump_stats writes it
+    return marshal.dumps(stats.stats)
+
+def render_stats(prefix: str, stats: Dict, counters: Tuple[str, ...] = ()) -> List[str]:
+    """Render a (nested) stats dict as gauges, and the keys in ``counters`` as counters."""
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            lines.extend(render_stats(name, value, counters))
+        elif key in counters:
+            lines.extend([f"# TYPE {name}_total counter", f"{name}_total {value}"])
+        else:
+            lines.extend([f"# TYPE {name} gauge", f"{name} {float(value)}"])
+    return lines
+
+def render_metrics(*extra: List[str]) -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    for block in extra:
+        lines.extend(block)
+    return "\n".join(lines) + "\n"
@@ -1,20 +1,55 @@
-from fastapi import FastAPI, HTTPException, Depends
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import cProfile
+import gzip
+import json
+import time
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional
-import networkx as nx
-from text_processor import TextProcessor
-from strategic_analyzer import StrategicAnalyzer
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Tuple
+import orjson
+import analysis_cache
+import bulk_io
+import component_index
+import instrumentation
+import map_analysis
+import migrations
+import text_processor
+import trajectory
+import version_store
+import workers
+from sqlalchemy import String, cast, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 # Explicitly import all models so SQLAlchemy knows about them
-from models import MapDB, MapVersionDB, Map, MapVersion, MapAnalysis, Component, Relationship
-from database import SessionLocal, engine, Base
+from models import MapComponentDB, MapDB, MapVersionDB, Map, MapVersion, MapAnalysis, Component, Relationship, IncrementalAnalysis, MapDiff
+from database import SessionLocal, engine
 from datetime import datetime
+import os
 
-# Ensure all models are registered before creating tables
-Base.metadata.create_all(bind=engine)
+# Disable when running several server processes and run `python migrations.py` once instead
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
 
-app = FastAPI()
+# Analyses at least this large are gzipped for clients that accept it; 0 disables compression
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_AUTO_MIGRATE:
+        await run_in_threadpool(migrations.init_schema, engine)
+    # Warm the worker processes in the background so /health answers meanwhile
+    workers.start()
+    app.state.warm_up = asyncio.create_task(workers.warm_up())
+    yield
+    app.state.warm_up.cancel()
+    workers.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend communication
 app.add_middleware(
@@ -25,6 +60,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Time each request by stage for Server-Timing and /metrics.
+
+    With PROFILING_ENABLED, a request sent with an ``X-Profile: 1`` header is
+    run under cProfile, here and in any CPU worker it uses, and the response
+    is replaced by the profile as a pstats file for download. The event-loop
+    part of the profile also sees whatever other requests ran meanwhile.
+    """
+    profile = instrumentation.PROFILING_ENABLED and request.headers.get(instrumentation.PROFILE_HEADER) == "1"
+    timings = instrumentation.begin_request(profile)
+    profiler = cProfile.Profile() if profile else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        response = await call_next(request)
+        if profiler:
+            # Run streaming bodies to completion so the profile covers them
+            async for _ in response.body_iterator:
+                pass
+    finally:
+        if profiler:
+            profiler.disable()
+    elapsed = time.perf_counter() - started
+    
+    route = request.scope.get("route")
+    instrumentation.REQUEST_SECONDS.observe(
+        elapsed, request.method, route.path if route else "unmatched", str(response.status_code)
+    )
+    headers = {"Server-Timing": instrumentation.server_timing(timings, elapsed)}
+    if profiler:
+        return Response(
+            instrumentation.profile_data(profiler),
+            media_type="application/octet-stream",
+            headers={
+                **headers,
+                "Content-Disposition": 'attachment; filename="profile.prof"',
+                "X-Profiled-Status": str(response.status_code)
+            }
+        )
+    response.headers.update(headers)
+    return response
+
+@app.get("/health")
+async def health():
+    """Liveness check."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness check; only succeeds once the NLP model is loaded and warm."""
+    if not workers.is_ready():
+        raise HTTPException(status_code=503, detail="NLP model is warming up")
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics():
+    """Stage and request latencies, pool and cache statistics in Prometheus text format."""
+    return PlainTextResponse(
+        instrumentation.render_metrics(
+            instrumentation.render_stats("wardley", workers.stats(), counters=("rejected",)),
+            instrumentation.render_stats(
+                "wardley_analysis_cache",
+                analysis_cache.cache.stats(),
+                counters=("hits", "misses", "persisted_hits", "evictions")
+            )
+        ),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/metrics/pools")
+async def pool_metrics():
+    """Queue depth and saturation of the CPU and DB worker pools."""
+    return workers.stats()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Hit/miss counters of the analysis cache."""
+    return analysis_cache.cache.stats()
+
+@app.exception_handler(workers.PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: workers.PoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -36,17 +160,14 @@ def get_db():
 class MapText(BaseModel):
     text: str
 
-class Component(BaseModel):
-    id: str
-    name: str
-    x: float  # Evolution (0-1)
-    y: float  # Value (0-1)
-    description: Optional[str] = None
+class MapTextStream(MapText):
+    chunk_chars: Optional[int] = Field(None, ge=1000)
+    partial_every: int = Field(5, ge=1)
 
-class Relationship(BaseModel):
-    source: str
-    target: str
-    type: str
+class MapTextBatch(BaseModel):
+    texts: List[str]
+    batch_size: Optional[int] = Field(None, ge=1)
+    n_process: Optional[int] = Field(None, ge=1)
 
 class WardleyMap(BaseModel):
     components: List[Component]
@@ -59,135 +180,164 @@ class Map(BaseModel):
     owner_id: int
     current_version: WardleyMap
 
-class MapVersion(BaseModel):
-    components: List[Component]
-    relationships: List[Relationship]
-    comment: Optional[str] = None
-
-def analyze_position(component: Component) -> Dict:
-    """Analyze component based on its position in the map."""
-    evolution_stage = ""
-    if component.x < 0.25:
-        evolution_stage = "Genesis"
-        characteristics = ["Undefined", "Rapidly changing", "Uncertain", "High risk"]
-    elif component.x < 0.5:
-        evolution_stage = "Custom Built"
-        characteristics = ["Emerging", "Improving", "Reducing risk", "High learning"]
-    elif component.x < 0.75:
-        evolution_stage = "Product"
-        characteristics = ["Stable", "Feature-driven", "Market differentiation", "Scalable"]
-    else:
-        evolution_stage = "Commodity"
-        characteristics = ["Standardized", "Cost-driven", "Reliable", "Utility-like"]
+def load_persisted_analysis(db: Session, key: str) -> Optional[Dict]:
+    """Find an analysis stored on any map version with the same content."""
+    row = db.query(MapVersionDB.analysis)\
+        .filter(
+            MapVersionDB.content_hash == key,
+            MapVersionDB.analysis.isnot(None),
+            # Rows written before the column stored None as SQL NULL hold JSON null
+            cast(MapVersionDB.analysis, String) != "null"
+        )\
+        .first()
+    if row and is_current_analysis(row.analysis):
+        return row.analysis
+    return None
+
+def is_current_analysis(analysis: Optional[Dict]) -> bool:
+    """Whether a persisted analysis was produced by the current analyzer."""
+    return bool(analysis) and analysis.get("schema_version") == analysis_cache.ANALYSIS_SCHEMA_VERSION
+
+def persist_analysis(db: Session, key: str, analysis: Dict) -> None:
+    """Store an analysis on every map version with the same content."""
+    db.query(MapVersionDB)\
+        .filter(MapVersionDB.content_hash == key)\
+        .update({MapVersionDB.analysis: analysis}, synchronize_session=False)
+    db.commit()
+
+def map_content_hash(wardley_map: MapVersion) -> Tuple[str, List[Dict]]:
+    """Content hash of a map, and its relationships as dicts."""
+    relationships = [r.dict() for r in wardley_map.relationships]
+    return analysis_cache.content_hash([c.dict() for c in wardley_map.components], relationships), relationships
+
+async def cached_analysis(wardley_map: MapVersion, db: Session) -> Dict:
+    """Analyze a map, reusing results for identical content."""
+    # Hashing sorts and serializes the whole map, too slow for the event loop on large maps
+    key, relationships = await run_in_threadpool(map_content_hash, wardley_map)
+    analysis = analysis_cache.cache.get(key)
+    if analysis is not None:
+        return analysis
     
-    value_classification = ""
-    strategic_implications = []
-    if component.y < 0.25:
-        value_classification = "Low Value"
-        strategic_implications = ["Outsource candidate", "Minimize investment", "Standardize"]
-    elif component.y < 0.75:
-        value_classification = "Medium Value"
-        strategic_implications = ["Balance investment", "Maintain efficiency", "Consider partnerships"]
+    analysis = await run_in_threadpool(load_persisted_analysis, db, key)
+    if analysis is not None:
+        analysis_cache.cache.record_persisted_hit()
     else:
-        value_classification = "High Value"
-        strategic_implications = ["Core focus", "Strategic investment", "In-house development"]
+        analysis = await workers.run_cpu(map_analysis.analyze_map, wardley_map)
+        analysis["content_hash"] = key
+        analysis["schema_version"] = analysis_cache.ANALYSIS_SCHEMA_VERSION
+        await run_in_threadpool(persist_analysis, db, key, analysis)
     
-    return {
-        "evolution_stage": evolution_stage,
-        "characteristics": characteristics,
-        "value_classification": value_classification,
-        "strategic_implications": strategic_implications,
-        "strategic_importance": component.y > 0.7 and component.x < 0.5
-    }
+    analysis_cache.cache.put(key, analysis, relationships)
+    return analysis
 
-def analyze_relationships(G: nx.DiGraph) -> Dict:
-    """Analyze the relationships in the map."""
-    analysis = {
-        "bottlenecks": [],
-        "dependencies": [],
-        "key_components": []
-    }
-    
-    # Identify bottlenecks (high betweenness centrality)
-    betweenness = nx.betweenness_centrality(G)
-    bottlenecks = sorted(betweenness.items(), key=lambda x: x[1], reverse=True)[:3]
-    analysis["bottlenecks"] = [{"id": node, "score": score} for node, score in bottlenecks if score > 0.1]
-    
-    # Analyze dependency chains
-    for node in G.nodes():
-        predecessors = list(G.predecessors(node))
-        successors = list(G.successors(node))
-        if len(predecessors) > 2 or len(successors) > 2:
-            analysis["dependencies"].append({
-                "id": node,
-                "dependencies_in": len(predecessors),
-                "dependencies_out": len(successors)
-            })
-    
-    # Identify key components (high pagerank)
-    pagerank = nx.pagerank(G)
-    key_components = sorted(pagerank.items(), key=lambda x: x[1], reverse=True)[:3]
-    analysis["key_components"] = [{"id": node, "score": score} for node, score in key_components]
-    
+def load_version_content(db: Session, key: Optional[str], map_id: Optional[int], version_num: Optional[int]):
+    """Find a stored version by content hash or by map and version number.
+
+    Returns the row and its reconstructed (components, relationships).
+    """
+    query = db.query(MapVersionDB)
+    if key:
+        row = query.filter(MapVersionDB.content_hash == key).first()
+    else:
+        row = query.filter(MapVersionDB.map_id == map_id, MapVersionDB.version == version_num).first()
+    if not row:
+        return None, None
+    return row, version_store.load_content(db, row.map_id, row.version)
+
+def moved_analysis(base: Dict, components: List[Dict], relationships: List[Dict], diff: MapDiff) -> Dict:
+    """Analysis of a map after a position-only diff, cached or updated from ``base``."""
+    key = analysis_cache.content_hash(components, relationships)
+    analysis = analysis_cache.cache.get(key)
+    if analysis is None:
+        analysis = map_analysis.reanalyze_positions(base, relationships, diff)
+        analysis["content_hash"] = key
+        analysis_cache.cache.put(key, analysis, relationships)
     return analysis
 
+def analysis_response(request: Request, analysis: Dict, compact: bool) -> Response:
+    """Serialize an analysis with orjson, skipping FastAPI's response validation and encoder.
+
+    Analyses are already JSON-compatible. ``compact`` lists each
+    recommendation template once and has recommendations refer to it by id.
+    Encoding and gzipping a large analysis takes a while, so async routes
+    call this in the threadpool.
+    """
+    if compact:
+        analysis = map_analysis.compact_analysis(analysis)
+    return orjson_response(request, analysis)
+
+def orjson_response(request: Request, data: Dict) -> Response:
+    """JSON response encoded by orjson, NumPy arrays included, and gzipped when large."""
+    body = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    headers = {"Vary": "Accept-Encoding"}
+    if GZIP_MIN_SIZE and len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.post("/analyze-map")
-async def analyze_map(wardley_map: MapVersion, db: Session = Depends(get_db)):
+async def analyze_map(
+    wardley_map: MapVersion,
+    http_request: Request,
+    compact: bool = False,
+    db: Session = Depends(get_db)
+):
     """Analyze the entire Wardley Map."""
-    analysis = {
-        "components": {},
-        "relationships": {},
-        "overall": {}
-    }
-    
-    # Create a graph for relationship analysis
-    G = nx.DiGraph()
-    
-    # Add nodes and analyze positions
-    for component in wardley_map.components:
-        G.add_node(component.id)
-        analysis["components"][component.id] = {
-            "component": component.dict(),
-            "position_analysis": analyze_position(component)
-        }
+    analysis = await cached_analysis(wardley_map, db)
+    return await run_in_threadpool(analysis_response, http_request, analysis, compact)
+
+@app.post("/analyze-map/incremental")
+async def analyze_map_incremental(
+    request: IncrementalAnalysis,
+    http_request: Request,
+    compact: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Re-analyze a map from a base analysis and a small diff.
+
+    Position-only diffs against a cached base are updated in place without
+    touching the graph metrics; any other diff falls back to a full analysis.
+    """
+    if not request.base_hash and (request.map_id is None or request.version is None):
+        raise HTTPException(status_code=422, detail="Provide base_hash or map_id and version")
     
-    # Add edges and analyze relationships
-    for rel in wardley_map.relationships:
-        G.add_edge(rel.source, rel.target)
+    key = request.base_hash
+    entry = analysis_cache.cache.get_entry(key) if key else None
+    if entry:
+        base_analysis, relationships = entry
+        components = [c["component"] for c in base_analysis["components"].values()]
+    else:
+        row, content = await run_in_threadpool(load_version_content, db, key, request.map_id, request.version)
+        if not content:
+            raise HTTPException(status_code=404, detail="Base analysis not found")
+        components, relationships = content
+        key = row.content_hash
+        base_analysis = analysis_cache.cache.peek(key) if key else None
+        if base_analysis is None and is_current_analysis(row.analysis):
+            base_analysis = row.analysis
     
-    # Analyze network properties
-    analysis["relationships"] = analyze_relationships(G)
+    try:
+        new_components, new_relationships = await run_in_threadpool(
+            map_analysis.apply_diff, components, relationships, request.diff
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Component {e.args[0]} not found in base map")
     
-    # Overall map analysis
-    comp_count = len(wardley_map.components)
-    avg_evolution = (sum(c.x for c in wardley_map.components) / comp_count) if comp_count > 0 else 0
-    avg_value = (sum(c.y for c in wardley_map.components) / comp_count) if comp_count > 0 else 0
-    analysis["overall"] = {
-        "complexity_score": nx.density(G),
-        "component_count": comp_count,
-        "relationship_count": len(wardley_map.relationships),
-        "average_evolution": avg_evolution,
-        "average_value": avg_value
-    }
+    if base_analysis is None or not request.diff.is_position_only():
+        wardley_map = MapVersion(components=new_components, relationships=new_relationships)
+        analysis = await cached_analysis(wardley_map, db)
+        return await run_in_threadpool(analysis_response, http_request, analysis, compact)
     
-    # Generate strategic recommendations
-    strategic_analyzer = StrategicAnalyzer()
-    recommendations = strategic_analyzer.analyze_map(
-        [c.dict() for c in wardley_map.components],
-        [r.dict() for r in wardley_map.relationships]
+    analysis = await run_in_threadpool(
+        moved_analysis, base_analysis, new_components, new_relationships, request.diff
     )
-    analysis["recommendations"] = recommendations
-    
-    return analysis
+    return await run_in_threadpool(analysis_response, http_request, analysis, compact)
 
 @app.post("/create-map")
 async def create_map(map_text: MapText, db: Session = Depends(get_db)):
     """Create a Wardley Map from text description."""
-    processor = TextProcessor()
-    
-    # Extract components and relationships
-    components = processor.extract_components(map_text.text)
-    relationships = processor.extract_relationships(map_text.text, components)
+    # Extract components and relationships from a single parse
+    components, relationships = await workers.run_cpu(text_processor.process_text, map_text.text)
     
     return {
         "components": components,
@@ -195,66 +345,205 @@ async def create_map(map_text: MapText, db: Session = Depends(get_db)):
         "description": map_text.text
     }
 
+def server_sent_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_map_events(text: str, partial_every: int, chunk_chars: int):
+    """Extract a map chunk by chunk, yielding progress as server-sent events.
+
+    Chunks are parsed in parallel, up to one per CPU worker, and merged in
+    document order. Relationships are resolved against every component found
+    so far, including those named in other chunks, so the final map matches
+    a parse of the whole text except where the parser would have read a
+    sentence differently without a chunk boundary before or after it.
+    """
+    bounds = text_processor.chunk_bounds(text, chunk_chars)
+    upcoming = iter(bounds)
+    pending = deque()
+    accumulator = text_processor.MapAccumulator()
+
+    def submit() -> None:
+        bound = next(upcoming, None)
+        if bound is not None:
+            start, end = bound
+            pending.append((end, asyncio.ensure_future(
+                workers.run_cpu(text_processor.process_chunk, text[start:end])
+            )))
+
+    try:
+        for _ in range(workers.CPU_WORKERS):
+            submit()
+        done = 0
+        while pending:
+            end, future = pending.popleft()
+            accumulator.merge(await future)
+            submit()
+            done += 1
+            yield server_sent_event("progress", {
+                "chunk": done,
+                "chunks": len(bounds),
+                "chars_processed": end,
+                "chars_total": len(text),
+                "components": len(accumulator.mentions)
+            })
+            if pending and done % partial_every == 0:
+                components, relationships = accumulator.result()
+                yield server_sent_event("partial", {"components": components, "relationships": relationships})
+        components, relationships = accumulator.result()
+        yield server_sent_event("map", {
+            "components": components,
+            "relationships": relationships,
+            "description": text
+        })
+    except workers.PoolSaturated as e:
+        yield server_sent_event("error", {"detail": str(e), "retry_after": e.retry_after})
+    finally:
+        # The client went away or a chunk failed; don't leave queued chunks behind
+        for _, future in pending:
+            future.cancel()
+
+@app.post("/create-map/stream")
+async def create_map_stream(map_text: MapTextStream):
+    """Create a Wardley Map from a long text, streaming progress and partial maps.
+
+    Responds with server-sent events: ``progress`` after each chunk,
+    ``partial`` every ``partial_every`` chunks, then the finished ``map``.
+    """
+    return StreamingResponse(
+        stream_map_events(
+            map_text.text,
+            map_text.partial_every,
+            map_text.chunk_chars or text_processor.CHUNK_CHARS
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.post("/create-maps/batch")
+async def create_maps_batch(batch: MapTextBatch):
+    """Create Wardley Maps from many text descriptions in one call.
+
+    The texts are split into ``n_process`` contiguous parts (default one per
+    CPU worker), each parsed by a pool worker, so the work stays within the
+    pool's limits.
+    """
+    parts = min(batch.n_process or workers.CPU_WORKERS, workers.CPU_WORKERS, max(len(batch.texts), 1))
+    size = max(-(-len(batch.texts) // parts), 1)
+    tasks = [
+        asyncio.ensure_future(workers.run_cpu(text_processor.process_batch, batch.texts[i:i + size], batch.batch_size))
+        for i in range(0, len(batch.texts), size)
+    ]
+    try:
+        results = [result for part in await asyncio.gather(*tasks) for result in part]
+    finally:
+        # Drop the other parts if one fails, e.g. with PoolSaturated
+        for task in tasks:
+            task.cancel()
+    
+    return {
+        "maps": [
+            {
+                "components": components,
+                "relationships": relationships,
+                "description": text
+            }
+            for text, (components, relationships) in zip(batch.texts, results)
+        ]
+    }
+
 @app.post("/maps/")
-async def create_new_map(map: Map, db: Session = Depends(get_db)):
+def create_new_map(map: Map, db: Session = Depends(get_db)):
     """Create a new map with version history."""
     db_map = MapDB(
         name=map.name,
         description=map.description,
-        owner_id=map.owner_id
+        owner_id=map.owner_id,
+        latest_version=1 if map.current_version else 0
     )
     db.add(db_map)
-    db.commit()
-    db.refresh(db_map)
+    db.flush()
     
     if map.current_version:
-        version = MapVersionDB(
-            map_id=db_map.id,
-            version=1,
-            components=map.current_version.dict()["components"],
-            relationships=map.current_version.dict()["relationships"],
+        components = map.current_version.dict()["components"]
+        relationships = map.current_version.dict()["relationships"]
+        key = analysis_cache.content_hash(components, relationships)
+        version = version_store.build_version(
+            db_map.id,
+            1,
+            components,
+            relationships,
+            content_hash=key,
+            analysis=analysis_cache.cache.peek(key),
             comment="Initial version"
         )
         db.add(version)
-        db.commit()
+        component_index.record_version(db, db_map.id, 1, None, (components, relationships))
     
-    return {"id": db_map.id}
+    map_id = db_map.id
+    db.commit()
+    return {"id": map_id}
+
+@app.post("/maps/import")
+async def import_maps(
+    request: Request,
+    chunk_size: int = Query(bulk_io.IMPORT_CHUNK_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Import maps and their version history from an NDJSON request body.
+
+    Lines are inserted in chunks of ``chunk_size`` rows within one
+    transaction, so a bad line leaves the database unchanged.
+    """
+    importer = bulk_io.Importer(db)
+    try:
+        async for lines in bulk_io.iter_line_chunks(request.stream(), chunk_size):
+            await run_in_threadpool(importer.add_lines, lines)
+        result = await run_in_threadpool(importer.finish)
+        await run_in_threadpool(db.commit)
+    except bulk_io.ImportFailed as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail="Duplicate version number in import")
+    return result
+
+@app.get("/maps/export")
+def export_maps(batch_size: int = Query(bulk_io.EXPORT_BATCH_SIZE, ge=1, le=10000)):
+    """Stream every map and its full version history as NDJSON."""
+    return StreamingResponse(
+        bulk_io.export_ndjson(SessionLocal, batch_size),
+        media_type="application/x-ndjson"
+    )
 
 @app.post("/maps/{map_id}/versions")
-async def create_map_version(
+def create_map_version(
     map_id: int,
     version: MapVersion,
     db: Session = Depends(get_db)
 ):
     """Create a new version of an existing map."""
-    db_map = db.query(MapDB).filter(MapDB.id == map_id).first()
-    if not db_map:
-        raise HTTPException(status_code=404, detail="Map not found")
-    
-    # Get latest version number
-    latest_version = db.query(MapVersionDB)\
-        .filter(MapVersionDB.map_id == map_id)\
-        .order_by(MapVersionDB.version.desc())\
-        .first()
-    
-    new_version_num = 1 if not latest_version else latest_version.version + 1
+    # Keyed by content so the new version picks up any cached analysis
+    components = version.dict()["components"]
+    relationships = version.dict()["relationships"]
+    key = analysis_cache.content_hash(components, relationships)
     
-    # Create new version
-    db_version = MapVersionDB(
-        map_id=map_id,
-        version=new_version_num,
-        components=version.dict()["components"],
-        relationships=version.dict()["relationships"],
-        comment=version.comment or f"Version {new_version_num}"
+    db_version = version_store.create_version(
+        db,
+        map_id,
+        components,
+        relationships,
+        version.comment,
+        content_hash=key,
+        analysis=analysis_cache.cache.peek(key)
     )
-    db.add(db_version)
-    db.commit()
-    db.refresh(db_version)
+    if db_version is None:
+        raise HTTPException(status_code=404, detail="Map not found")
     
     return db_version
 
 @app.get("/maps/{map_id}/versions/{version_num}")
-async def get_map_version(
+def get_map_version(
     map_id: int,
     version_num: int,
     db: Session = Depends(get_db)
@@ -264,20 +553,249 @@ async def get_map_version(
         .filter(MapVersionDB.map_id == map_id, MapVersionDB.version == version_num)\
         .first()
     
-    if not version:
+    content = version_store.load_content(db, map_id, version_num) if version else None
+    if not content:
         raise HTTPException(status_code=404, detail="Version not found")
     
-    return version
+    return version_store.serialize_version(version, content)
+
+# Order in which diff sections are paged through
+DIFF_SECTIONS = [
+    ("components", "added"),
+    ("components", "removed"),
+    ("components", "moved"),
+    ("components", "changed"),
+    ("relationships", "added"),
+    ("relationships", "removed")
+]
+
+@app.get("/maps/{map_id}/diff")
+def diff_map_versions(
+    map_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Diff two versions of a map on the server.
+
+    Changes are paged in DIFF_SECTIONS order; ``summary`` always has the full
+    counts and ``next_offset`` is null on the last page.
+    """
+    old = version_store.load_content(db, map_id, from_version)
+    new = version_store.load_content(db, map_id, to_version)
+    if old is None or new is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    
+    diff = version_store.diff_content(old, new)
+    page = {"components": {}, "relationships": {}}
+    summary = {}
+    position = 0
+    for group, kind in DIFF_SECTIONS:
+        items = diff[group][kind]
+        summary[f"{group}_{kind}"] = len(items)
+        start = min(max(offset - position, 0), len(items))
+        end = min(max(offset + limit - position, 0), len(items))
+        page[group][kind] = items[start:end]
+        position += len(items)
+    
+    return {
+        "map_id": map_id,
+        "from": from_version,
+        "to": to_version,
+        "summary": summary,
+        **page,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < position else None
+    }
+
+# Payload fields that list_map_versions only returns when asked for
+VERSION_PAYLOAD_FIELDS = {"components", "relationships", "analysis"}
 
 @app.get("/maps/{map_id}/versions")
-async def list_map_versions(
+def list_map_versions(
     map_id: int,
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """List all versions of a map."""
-    versions = db.query(MapVersionDB)\
-        .filter(MapVersionDB.map_id == map_id)\
-        .order_by(MapVersionDB.version.desc())\
-        .all()
+    """List a map's versions, newest first, one page at a time.
+
+    Only metadata is returned unless ``fields`` names payload fields
+    (comma-separated components, relationships, analysis). Pass
+    ``next_before`` from a page as ``before`` to fetch the next one.
+    """
+    requested = {f.strip() for f in fields.split(",") if f.strip()} if fields else set()
+    unknown = requested - VERSION_PAYLOAD_FIELDS
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    columns = [
+        MapVersionDB.id,
+        MapVersionDB.map_id,
+        MapVersionDB.version,
+        MapVersionDB.comment,
+        MapVersionDB.created_at,
+        MapVersionDB.component_count,
+        MapVersionDB.relationship_count,
+        MapVersionDB.content_hash
+    ]
+    if "analysis" in requested:
+        columns.append(MapVersionDB.analysis)
+    
+    # Keyset pagination over the (map_id, version) index
+    query = db.query(*columns).filter(MapVersionDB.map_id == map_id)
+    if before is not None:
+        query = query.filter(MapVersionDB.version < before)
+    rows = query.order_by(MapVersionDB.version.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    versions = [dict(row._mapping) for row in rows]
+    if rows and requested & {"components", "relationships"}:
+        contents = version_store.load_content_range(db, map_id, rows[-1].version, rows[0].version)
+        for version in versions:
+            components, relationships = contents[version["version"]]
+            if "components" in requested:
+                version["components"] = components
+            if "relationships" in requested:
+                version["relationships"] = relationships
+    
+    return {
+        "versions": versions,
+        "next_before": rows[-1].version if has_more else None
+    }
+
+@app.get("/search/components")
+def search_components(
+    name: Optional[str] = None,
+    min_evolution: Optional[float] = Query(None, ge=0, le=1),
+    max_evolution: Optional[float] = Query(None, ge=0, le=1),
+    min_value: Optional[float] = Query(None, ge=0, le=1),
+    max_value: Optional[float] = Query(None, ge=0, le=1),
+    map_id: Optional[int] = None,
+    version: Optional[int] = Query(None, ge=1),
+    history: bool = False,
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Find components across maps by name, evolution (x) and value (y).
+
+    ``name`` matches case-insensitively anywhere in the component name.
+    Searches the latest version of each map, unless ``version`` picks one
+    (with ``map_id``) or ``history`` includes every past state, each with
+    the range of versions it was valid for. Pass ``next_after`` from a page
+    as ``after`` to fetch the next one.
+    """
+    if version is not None and map_id is None:
+        raise HTTPException(status_code=422, detail="version requires map_id")
+    
+    query = db.query(
+        MapComponentDB.id,
+        MapComponentDB.map_id,
+        MapDB.name.label("map_name"),
+        MapComponentDB.component_id,
+        MapComponentDB.name,
+        MapComponentDB.x,
+        MapComponentDB.y,
+        MapComponentDB.from_version,
+        MapComponentDB.to_version
+    ).join(MapDB, MapDB.id == MapComponentDB.map_id)
+    if map_id is not None:
+        query = query.filter(MapComponentDB.map_id == map_id)
+    if version is not None:
+        query = query.filter(
+            MapComponentDB.from_version <= version,
+            or_(MapComponentDB.to_version.is_(None), MapComponentDB.to_version >= version)
+        )
+    elif not history:
+        query = query.filter(MapComponentDB.to_version.is_(None))
+    if name:
+        query = query.filter(MapComponentDB.name_lower.contains(name.lower(), autoescape=True))
+    if min_evolution is not None:
+        query = query.filter(MapComponentDB.x >= min_evolution)
+    if max_evolution is not None:
+        query = query.filter(MapComponentDB.x <= max_evolution)
+    if min_value is not None:
+        query = query.filter(MapComponentDB.y >= min_value)
+    if max_value is not None:
+        query = query.filter(MapComponentDB.y <= max_value)
+    
+    # Keyset pagination over the primary key
+    if after is not None:
+        query = query.filter(MapComponentDB.id > after)
+    rows = query.order_by(MapComponentDB.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        "results": [
+            {
+                "map_id": row.map_id,
+                "map_name": row.map_name,
+                "component_id": row.component_id,
+                "name": row.name,
+                "x": row.x,
+                "y": row.y,
+                "from_version": row.from_version,
+                "to_version": row.to_version
+            }
+            for row in rows
+        ],
+        "next_after": rows[-1].id if has_more else None
+    }
+
+def trajectory_range(db: Session, map_id: int, from_version: int, to_version: Optional[int]) -> int:
+    """Last version of a trajectory request, raising 404 for an unknown map."""
+    latest = db.query(MapDB.latest_version).filter(MapDB.id == map_id).scalar()
+    if latest is None:
+        raise HTTPException(status_code=404, detail="Map not found")
+    return min(to_version, latest) if to_version is not None else latest
+
+@app.get("/maps/{map_id}/components/{component_id}/trajectory")
+def get_component_trajectory(
+    map_id: int,
+    component_id: str,
+    request: Request,
+    from_version: int = Query(1, alias="from", ge=1),
+    to_version: Optional[int] = Query(None, alias="to", ge=1),
+    db: Session = Depends(get_db)
+):
+    """A component's position in every version it is part of, as columnar arrays.
+
+    ``evolution_velocity`` and ``evolution_acceleration`` are the change of x
+    per version and of that velocity, null where undefined.
+    """
+    high = trajectory_range(db, map_id, from_version, to_version)
+    series = trajectory.load_trajectories(db, map_id, from_version, high, {component_id})
+    result = trajectory.component_trajectory(series, component_id) if series else None
+    if result is None:
+        raise HTTPException(status_code=404, detail="Component not found")
+    
+    return orjson_response(request, {"map_id": map_id, **result})
+
+@app.get("/maps/{map_id}/trajectories")
+def get_map_trajectories(
+    map_id: int,
+    request: Request,
+    components: Optional[str] = None,
+    from_version: int = Query(1, alias="from", ge=1),
+    to_version: Optional[int] = Query(None, alias="to", ge=1),
+    db: Session = Depends(get_db)
+):
+    """Trajectories of all components, or the comma-separated ``components``.
+
+    Every series is aligned on the shared ``versions`` axis, with null where
+    a component is absent.
+    """
+    high = trajectory_range(db, map_id, from_version, to_version)
+    component_ids = {c.strip() for c in components.split(",") if c.strip()} if components else None
+    series = trajectory.load_trajectories(db, map_id, from_version, high, component_ids)
+    if series is None:
+        raise HTTPException(status_code=404, detail="Version not found")
     
-    return versions
+    return orjson_response(request, {"map_id": map_id, **trajectory.all_trajectories(series)})
@@ -0,0 +1,222 @@
+import bisect
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from models import Component, MapDiff, MapVersion
+from strategic_analyzer import StrategicAnalyzer, POSITION_RULES, compact_recommendations
+from graph_metrics import GraphMetrics
+import instrumentation
+from map_graph import MapGraph
+
+# Stage boundaries on each axis; a position on a boundary belongs to the stage above it
+EVOLUTION_BOUNDARIES = (0.25, 0.5, 0.75)
+EVOLUTION_STAGES = ("Genesis", "Custom Built", "Product", "Commodity")
+STAGE_CHARACTERISTICS = (
+    ("Undefined", "Rapidly changing", "Uncertain", "High risk"),
+    ("Emerging", "Improving", "Reducing risk", "High learning"),
+    ("Stable", "Feature-driven", "Market differentiation", "Scalable"),
+    ("Standardized", "Cost-driven", "Reliable", "Utility-like")
+)
+
+VALUE_BOUNDARIES = (0.25, 0.75)
+VALUE_CLASSIFICATIONS = ("Low Value", "Medium Value", "High Value")
+VALUE_IMPLICATIONS = (
+    ("Outsource candidate", "Minimize investment", "Standardize"),
+    ("Balance investment", "Maintain efficiency", "Consider partnerships"),
+    ("Core focus", "Strategic investment", "In-house development")
+)
+
+# Strategically important: high value while still early in evolution
+STRATEGIC_MIN_VALUE = 0.7
+STRATEGIC_MAX_EVOLUTION = 0.5
+
+def _position_result(stage: int, value_class: int, important: bool) -> Dict:
+    # The characteristic and implication tuples are shared, not copied per component
+    return {
+        "evolution_stage": EVOLUTION_STAGES[stage],
+        "characteristics": STAGE_CHARACTERISTICS[stage],
+        "value_classification": VALUE_CLASSIFICATIONS[value_class],
+        "strategic_implications": VALUE_IMPLICATIONS[value_class],
+        "strategic_importance": important
+    }
+
+def analyze_position(component: Component) -> Dict:
+    """Analyze component based on its position in the map."""
+    return _position_result(
+        bisect.bisect_right(EVOLUTION_BOUNDARIES, component.x),
+        bisect.bisect_right(VALUE_BOUNDARIES, component.y),
+        component.y > STRATEGIC_MIN_VALUE and component.x < STRATEGIC_MAX_EVOLUTION
+    )
+
+def analyze_positions(x: np.ndarray, y: np.ndarray) -> List[Dict]:
+    """Columnar analyze_position for all components at once.
+
+    Stages are found by binning the evolution (x) and value (y) arrays in a
+    single vectorized pass each.
+    """
+    stages = np.digitize(x, EVOLUTION_BOUNDARIES).tolist()
+    value_classes = np.digitize(y, VALUE_BOUNDARIES).tolist()
+    important = ((y > STRATEGIC_MIN_VALUE) & (x < STRATEGIC_MAX_EVOLUTION)).tolist()
+    return [_position_result(*position) for position in zip(stages, value_classes, important)]
+
+@instrumentation.timed("analysis.relationships")
+def analyze_relationships(graph: MapGraph, metrics: Optional[GraphMetrics] = None) -> Dict:
+    """Analyze the relationships in the map."""
+    metrics = metrics or GraphMetrics(graph)
+    analysis = {
+        "bottlenecks": [],
+        "dependencies": [],
+        "key_components": [],
+        "circular_dependencies": metrics.cycles
+    }
+    
+    # Identify bottlenecks (high betweenness centrality)
+    betweenness = metrics.betweenness
+    bottlenecks = sorted(betweenness.items(), key=lambda x: x[1], reverse=True)[:3]
+    analysis["bottlenecks"] = [{"id": node, "score": score} for node, score in bottlenecks if score > 0.1]
+    
+    # Analyze dependency chains
+    in_degree = graph.in_degree
+    out_degree = graph.out_degree
+    for node in np.flatnonzero((in_degree > 2) | (out_degree > 2)).tolist():
+        analysis["dependencies"].append({
+            "id": graph.ids[node],
+            "dependencies_in": int(in_degree[node]),
+            "dependencies_out": int(out_degree[node])
+        })
+    
+    # Identify key components (high pagerank)
+    pagerank = metrics.pagerank
+    key_components = sorted(pagerank.items(), key=lambda x: x[1], reverse=True)[:3]
+    analysis["key_components"] = [{"id": node, "score": score} for node, score in key_components]
+    
+    return analysis
+
+def analyze_map(wardley_map: MapVersion) -> Dict:
+    """Analyze the entire Wardley Map."""
+    analysis = {
+        "components": {},
+        "relationships": {},
+        "overall": {}
+    }
+    
+    # Build the graph once, positions included, for both analyzers
+    components = wardley_map.components
+    comp_count = len(components)
+    with instrumentation.stage("analysis.graph"):
+        graph = MapGraph.from_models(components, wardley_map.relationships)
+    x = graph.x
+    y = graph.y
+    
+    # Analyze all positions together
+    with instrumentation.stage("analysis.positions"):
+        positions = analyze_positions(x, y)
+    for component in components:
+        analysis["components"][component.id] = {
+            "component": component.dict(),
+            "position_analysis": positions[graph.index[component.id]]
+        }
+    
+    # Analyze network properties, sharing centralities with the strategic analyzer
+    metrics = GraphMetrics(graph)
+    strategic_analyzer = StrategicAnalyzer()
+    clusters = strategic_analyzer.strategic_clusters(graph)
+    analysis["relationships"] = analyze_relationships(graph, metrics)
+    analysis["relationships"]["strategic_clusters"] = clusters
+    
+    # Overall map analysis
+    analysis["overall"] = {
+        "complexity_score": metrics.density,
+        "component_count": comp_count,
+        "relationship_count": len(wardley_map.relationships),
+        "average_evolution": float(x.mean()) if comp_count > 0 else 0,
+        "average_value": float(y.mean()) if comp_count > 0 else 0
+    }
+    
+    # Generate strategic recommendations
+    recommendations = strategic_analyzer.analyze_map(graph, metrics=metrics, clusters=clusters)
+    analysis["recommendations"] = recommendations
+    
+    return analysis
+
+def compact_analysis(analysis: Dict) -> Dict:
+    """An analysis whose recommendations refer to shared templates instead of repeating them."""
+    templates, references = compact_recommendations(analysis["recommendations"])
+    return {**analysis, "recommendation_templates": templates, "recommendations": references}
+
+def apply_diff(components: List[Dict], relationships: List[Dict], diff: MapDiff) -> Tuple[List[Dict], List[Dict]]:
+    """Apply a diff to a map's components and relationships, returning new lists."""
+    removed = set(diff.removed_components)
+    by_id = {c['id']: c for c in components if c['id'] not in removed}
+    for move in diff.moved:
+        if move.id not in by_id:
+            raise KeyError(move.id)
+        by_id[move.id] = {**by_id[move.id], 'x': move.x, 'y': move.y}
+    for component in diff.added_components:
+        by_id[component.id] = component.dict()
+    
+    removed_edges = {(r.source, r.target, r.type) for r in diff.removed_relationships}
+    new_relationships = [
+        r for r in relationships
+        if (r['source'], r['target'], r['type']) not in removed_edges
+        and r['source'] not in removed and r['target'] not in removed
+    ]
+    new_relationships.extend(r.dict() for r in diff.added_relationships)
+    return list(by_id.values()), new_relationships
+
+def reanalyze_positions(base: Dict, relationships: List[Dict], diff: MapDiff) -> Dict:
+    """Update an analysis for a diff that only moves existing components.
+
+    The graph is unchanged, so relationship metrics and graph-derived
+    recommendations are reused. Only the moved components' position analysis
+    and position rules, the averages and, if a strategic component moved or a
+    component crossed the strategic value threshold, the strategic clusters
+    are recomputed.
+    """
+    strategic_analyzer = StrategicAnalyzer()
+    strategic_threshold = strategic_analyzer.value_thresholds['medium']
+    components = dict(base["components"])
+    comp_count = len(components)
+    evolution_total = base["overall"]["average_evolution"] * comp_count
+    value_total = base["overall"]["average_value"] * comp_count
+    
+    moved_ids = set()
+    moved_recommendations = []
+    clusters_affected = False
+    for move in diff.moved:
+        old = components[move.id]["component"]
+        component = Component(**{**old, "x": move.x, "y": move.y})
+        components[move.id] = {
+            "component": component.dict(),
+            "position_analysis": analyze_position(component)
+        }
+        evolution_total += move.x - old["x"]
+        value_total += move.y - old["y"]
+        if old["y"] > strategic_threshold or move.y > strategic_threshold:
+            clusters_affected = True
+        moved_ids.add(move.id)
+        moved_recommendations.extend(strategic_analyzer.position_recommendations(move.id, move.x, move.y))
+    
+    recommendations = [
+        rec for rec in base["recommendations"]
+        if not (rec["component_id"] in moved_ids and rec["rule"] in POSITION_RULES)
+        and not (clusters_affected and rec["rule"] == "strategic_cluster")
+    ]
+    recommendations.extend(moved_recommendations)
+    relationship_analysis = base["relationships"]
+    if clusters_affected:
+        graph = MapGraph.from_dicts([c["component"] for c in components.values()], relationships)
+        clusters = strategic_analyzer.strategic_clusters(graph)
+        relationship_analysis = {**relationship_analysis, "strategic_clusters": clusters}
+        recommendations.extend(strategic_analyzer.cluster_recommendations(clusters))
+    
+    return {
+        **base,
+        "components": components,
+        "relationships": relationship_analysis,
+        "overall": {
+            **base["overall"],
+            "average_evolution": evolution_total / comp_count if comp_count > 0 else 0,
+            "average_value": value_total / comp_count if comp_count > 0 else 0
+        },
+        "recommendations": recommendations
+    }
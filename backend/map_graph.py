@@ -0,0 +1,113 @@
+from functools import cached_property
+from operator import attrgetter, itemgetter
+from typing import Dict, Iterable, List, Sequence, Union
+import numpy as np
+from scipy import sparse
+from models import Component, Relationship
+
+class MapGraph:
+    """Compact directed graph of a map, built once per analysis.
+
+    Nodes are integer indices into ``ids``: the map's components first, in
+    map order, followed by any relationship endpoints that are not components.
+    Edges are stored as CSR arrays (``indptr``/``indices``) with duplicates
+    removed and each node's successors in relationship order. ``x`` and ``y``
+    hold the components' positions.
+    """
+
+    def __init__(self, ids: List[str], x: np.ndarray, y: np.ndarray, component_count: int, sources: np.ndarray, targets: np.ndarray):
+        self.ids = ids
+        self.index = {node_id: i for i, node_id in enumerate(ids)}
+        self.x = x
+        self.y = y
+        self.component_count = component_count
+        n = len(ids)
+
+        # Drop repeated edges, keeping first occurrences in their original order
+        if len(sources):
+            _, first = np.unique(sources * n + targets, return_index=True)
+            keep = np.sort(first)
+            sources, targets = sources[keep], targets[keep]
+        order = np.argsort(sources, kind="stable")
+        self.indices = targets[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=self.indptr[1:])
+
+    @classmethod
+    def from_models(cls, components: Sequence[Component], relationships: Sequence[Relationship]) -> "MapGraph":
+        return cls._build(components, relationships, attrgetter('id', 'x', 'y'), attrgetter('source', 'target'))
+
+    @classmethod
+    def from_dicts(cls, components: Sequence[Dict], relationships: Sequence[Dict]) -> "MapGraph":
+        return cls._build(components, relationships, itemgetter('id', 'x', 'y'), itemgetter('source', 'target'))
+
+    @classmethod
+    def _build(cls, components, relationships, component_fields, edge_fields) -> "MapGraph":
+        index: Dict[str, int] = {}
+        xs: List[float] = []
+        ys: List[float] = []
+        for component in components:
+            node_id, x, y = component_fields(component)
+            i = index.setdefault(node_id, len(index))
+            if i == len(xs):
+                xs.append(x)
+                ys.append(y)
+            else:
+                # A repeated id takes the later position, as it would on a networkx node
+                xs[i] = x
+                ys[i] = y
+        component_count = len(index)
+
+        sources = []
+        targets = []
+        for rel in relationships:
+            source, target = edge_fields(rel)
+            sources.append(index.setdefault(source, len(index)))
+            targets.append(index.setdefault(target, len(index)))
+
+        return cls(
+            list(index),
+            np.array(xs, dtype=float),
+            np.array(ys, dtype=float),
+            component_count,
+            np.array(sources, dtype=np.int64),
+            np.array(targets, dtype=np.int64)
+        )
+
+    @property
+    def node_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    @cached_property
+    def adjacency(self) -> sparse.csr_array:
+        """SciPy sparse view of the adjacency matrix, sharing the CSR arrays."""
+        n = self.node_count
+        return sparse.csr_array((np.ones(self.edge_count), self.indices, self.indptr), shape=(n, n))
+
+    @cached_property
+    def successors(self) -> List[List[int]]:
+        """Successor lists per node, for traversals that run in Python."""
+        indices = self.indices.tolist()
+        indptr = self.indptr.tolist()
+        return [indices[indptr[i]:indptr[i + 1]] for i in range(self.node_count)]
+
+    @cached_property
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    @cached_property
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.node_count)
+
+    def has_edge(self, source: int, target: int) -> bool:
+        return target in self.indices[self.indptr[source]:self.indptr[source + 1]]
+
+    def by_id(self, values: Union[np.ndarray, Iterable]) -> Dict[str, object]:
+        """Map per-node values back to node ids."""
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        return dict(zip(self.ids, values))
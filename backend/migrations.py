@@ -0,0 +1,250 @@
+import logging
+import os
+import time
+from sqlalchemy import exists, inspect, null, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+from analysis_cache import content_hash
+from database import Base
+from models import MapComponentDB, MapEdgeDB, MapVersionDB
+import component_index
+import version_store
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+# How long init_schema waits for the database to come up
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "10"))
+DB_CONNECT_RETRY_DELAY = float(os.getenv("DB_CONNECT_RETRY_DELAY", "2"))
+
+def wait_for_database(engine: Engine) -> None:
+    for attempt in range(DB_CONNECT_RETRIES):
+        try:
+            with engine.connect():
+                return
+        except OperationalError:
+            if attempt == DB_CONNECT_RETRIES - 1:
+                raise
+            time.sleep(DB_CONNECT_RETRY_DELAY)
+
+def init_schema(engine: Engine) -> None:
+    """Create missing tables and apply upgrades once the database accepts connections."""
+    wait_for_database(engine)
+    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
+    _backfill_component_index(engine)
+    if engine.dialect.name == "postgresql":
+        _create_trigram_index(engine)
+
+def upgrade(engine: Engine) -> None:
+    """Bring a database created by an older release up to the current schema.
+
+    Safe to run repeatedly; tables created by create_all are already current.
+    """
+    columns = {c['name'] for c in inspect(engine).get_columns('map_versions')}
+    with engine.begin() as conn:
+        if 'content_hash' not in columns:
+            conn.execute(text("ALTER TABLE map_versions ADD COLUMN content_hash VARCHAR(64)"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_map_versions_content_hash ON map_versions (content_hash)"
+            ))
+        if 'delta' not in columns:
+            conn.execute(text("ALTER TABLE map_versions ADD COLUMN delta JSON"))
+        for column in ('component_count', 'relationship_count'):
+            if column not in columns:
+                conn.execute(text(f"ALTER TABLE map_versions ADD COLUMN {column} INTEGER"))
+    _backfill_content_hashes(engine)
+    _backfill_counts(engine)
+    _enforce_unique_versions(engine)
+
+def _enforce_unique_versions(engine: Engine) -> None:
+    """Renumber duplicate versions left by racing saves and add the unique index.
+
+    Only does work on a database from before the unique index; once it
+    exists, saves maintain maps.latest_version and nothing is rewritten.
+    """
+    inspector = inspect(engine)
+    map_columns = {c['name'] for c in inspector.get_columns('maps')}
+    version_indexes = {i['name'] for i in inspector.get_indexes('map_versions')}
+    with engine.begin() as conn:
+        added_latest_version = 'latest_version' not in map_columns
+        if added_latest_version:
+            conn.execute(text("ALTER TABLE maps ADD COLUMN latest_version INTEGER NOT NULL DEFAULT 0"))
+        
+        duplicated = []
+        if 'uq_map_versions_map_id_version' not in version_indexes:
+            duplicated = conn.execute(text(
+                "SELECT DISTINCT map_id FROM map_versions GROUP BY map_id, version HAVING COUNT(*) > 1"
+            )).scalars().all()
+            for map_id in duplicated:
+                ids = conn.execute(
+                    text("SELECT id FROM map_versions WHERE map_id = :map_id ORDER BY version, id"),
+                    {"map_id": map_id}
+                ).scalars().all()
+                # Two passes so intermediate numbers never collide
+                for i, row_id in enumerate(ids, start=1):
+                    conn.execute(text("UPDATE map_versions SET version = :v WHERE id = :id"), {"v": -i, "id": row_id})
+                conn.execute(text("UPDATE map_versions SET version = -version WHERE map_id = :map_id"), {"map_id": map_id})
+            
+            conn.execute(text("DROP INDEX IF EXISTS ix_map_versions_map_id_version"))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_map_versions_map_id_version ON map_versions (map_id, version)"
+            ))
+        
+        latest = "(SELECT COALESCE(MAX(version), 0) FROM map_versions WHERE map_versions.map_id = maps.id)"
+        if added_latest_version:
+            conn.execute(text(f"UPDATE maps SET latest_version = {latest}"))
+        else:
+            # Renumbering moves the highest version of the maps it touched
+            for map_id in duplicated:
+                conn.execute(text(f"UPDATE maps SET latest_version = {latest} WHERE id = :map_id"), {"map_id": map_id})
+
+def _backfill_content_hashes(engine: Engine) -> None:
+    with Session(engine) as db:
+        while True:
+            rows = db.execute(
+                select(MapVersionDB.id, MapVersionDB.components, MapVersionDB.relationships)
+                .where(MapVersionDB.content_hash.is_(None), MapVersionDB.delta.is_(None))
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for row_id, components, relationships in rows:
+                db.execute(
+                    update(MapVersionDB)
+                    .where(MapVersionDB.id == row_id)
+                    .values(content_hash=content_hash(components or [], relationships or []))
+                )
+            db.commit()
+
+def _backfill_counts(engine: Engine) -> None:
+    with Session(engine) as db:
+        map_ids = db.execute(
+            select(MapVersionDB.map_id).where(MapVersionDB.component_count.is_(None)).distinct()
+        ).scalars().all()
+        for map_id in map_ids:
+            rows = db.execute(
+                select(
+                    MapVersionDB.id,
+                    MapVersionDB.components,
+                    MapVersionDB.relationships,
+                    MapVersionDB.delta,
+                    MapVersionDB.component_count
+                )
+                .where(MapVersionDB.map_id == map_id)
+                .order_by(MapVersionDB.version)
+            ).all()
+            for row, (components, relationships) in zip(rows, version_store.iter_contents(rows)):
+                if row.component_count is None:
+                    db.execute(
+                        update(MapVersionDB)
+                        .where(MapVersionDB.id == row.id)
+                        .values(component_count=len(components), relationship_count=len(relationships))
+                    )
+            db.commit()
+
+def _backfill_component_index(engine: Engine) -> None:
+    """Index the stored versions of every map that has content but no index rows.
+
+    Each map is indexed in its own transaction, so an interrupted backfill
+    resumes with the maps it had not reached; once all are indexed this is a
+    single query.
+    """
+    with Session(engine) as db:
+        map_ids = db.execute(
+            select(MapVersionDB.map_id)
+            .where(
+                or_(MapVersionDB.component_count > 0, MapVersionDB.relationship_count > 0),
+                ~exists().where(MapComponentDB.map_id == MapVersionDB.map_id),
+                ~exists().where(MapEdgeDB.map_id == MapVersionDB.map_id)
+            )
+            .distinct()
+        ).scalars().all()
+        if map_ids:
+            logger.info("Indexing the version history of %d maps for component search", len(map_ids))
+        for done, map_id in enumerate(map_ids, start=1):
+            rows = db.execute(
+                select(
+                    MapVersionDB.version,
+                    MapVersionDB.components,
+                    MapVersionDB.relationships,
+                    MapVersionDB.delta
+                )
+                .where(MapVersionDB.map_id == map_id)
+                .order_by(MapVersionDB.version)
+            ).all()
+            index = component_index.IndexBuffer()
+            previous = None
+            for row, content in zip(rows, version_store.iter_contents(rows)):
+                index.add_version(map_id, row.version, previous, content)
+                previous = content
+            index.flush(db, {map_id: map_id})
+            db.commit()
+            if done % BACKFILL_BATCH_SIZE == 0 or done == len(map_ids):
+                logger.info("Indexed %d of %d maps", done, len(map_ids))
+
+def _create_trigram_index(engine: Engine) -> None:
+    """Serve substring name searches from a trigram index where pg_trgm is available."""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_map_components_name_trgm "
+                "ON map_components USING gin (name_lower gin_trgm_ops)"
+            ))
+    except DBAPIError as e:
+        logger.warning("Component name search will scan without a trigram index: %s", e)
+
+def convert_versions_to_deltas(engine: Engine) -> int:
+    """Re-encode full-copy versions as deltas between snapshots.
+
+    Runs one map at a time and is safe to re-run; returns the number of rows
+    converted.
+    """
+    converted = 0
+    with Session(engine) as db:
+        map_ids = db.execute(select(MapVersionDB.map_id).distinct()).scalars().all()
+        for map_id in map_ids:
+            rows = db.execute(
+                select(
+                    MapVersionDB.id,
+                    MapVersionDB.version,
+                    MapVersionDB.components,
+                    MapVersionDB.relationships,
+                    MapVersionDB.delta
+                )
+                .where(MapVersionDB.map_id == map_id)
+                .order_by(MapVersionDB.version)
+            ).all()
+            
+            deltas = []
+            previous = None
+            for row, content in zip(rows, version_store.iter_contents(rows)):
+                if (
+                    row.delta is None
+                    and previous is not None
+                    and not version_store.is_snapshot_due(row.version)
+                    and version_store.can_encode_delta(previous, content[0])
+                ):
+                    delta = version_store.compute_delta(*previous, *content)
+                    if not version_store.delta_is_large(delta, *content):
+                        deltas.append((row.id, delta))
+                previous = content
+            
+            for row_id, delta in deltas:
+                db.execute(
+                    update(MapVersionDB)
+                    .where(MapVersionDB.id == row_id)
+                    .values(delta=delta, components=null(), relationships=null())
+                )
+            db.commit()
+            converted += len(deltas)
+    return converted
+
+if __name__ == "__main__":
+    from database import engine
+    logging.basicConfig(level=logging.INFO)
+    init_schema(engine)
+    print(f"Converted {convert_versions_to_deltas(engine)} versions to deltas")
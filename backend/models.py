@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from typing import List, Optional
@@ -14,6 +14,7 @@ class MapDB(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     owner_id = Column(String, index=True)
+    latest_version = Column(Integer, nullable=False, default=0, server_default="0")
     versions = relationship("MapVersionDB", back_populates="map")
     
 class MapVersionDB(Base):
@@ -24,18 +25,64 @@ class MapVersionDB(Base):
     version = Column(Integer)
     components = Column(JSON)
     relationships = Column(JSON)
-    analysis = Column(JSON)
+    content_hash = Column(String(64), index=True)
+    delta = Column(JSON)  # set instead of components/relationships on non-snapshot versions
+    component_count = Column(Integer)
+    relationship_count = Column(Integer)
+    analysis = Column(JSON(none_as_null=True))  # SQL NULL, not JSON null, until analyzed
     created_at = Column(DateTime, default=datetime.utcnow)
     comment = Column(String)
     
     map = relationship("MapDB", back_populates="versions")
 
+    __table_args__ = (
+        Index("uq_map_versions_map_id_version", "map_id", "version", unique=True),
+    )
+
+class MapComponentDB(Base):
+    """One state of a component, searchable across maps; see component_index."""
+    __tablename__ = "map_components"
+    
+    id = Column(Integer, primary_key=True)
+    map_id = Column(Integer, ForeignKey("maps.id"), nullable=False)
+    component_id = Column(String, nullable=False)
+    name = Column(String)
+    name_lower = Column(String)
+    x = Column(Float)
+    y = Column(Float)
+    from_version = Column(Integer, nullable=False)
+    to_version = Column(Integer)  # NULL while the state is current
+
+    __table_args__ = (
+        Index("ix_map_components_map_id_component_id", "map_id", "component_id", "to_version"),
+        Index("ix_map_components_name_lower", "name_lower"),
+        Index("ix_map_components_x", "x"),
+        Index("ix_map_components_y", "y"),
+    )
+
+class MapEdgeDB(Base):
+    """One relationship between components, valid over a range of versions."""
+    __tablename__ = "map_edges"
+    
+    id = Column(Integer, primary_key=True)
+    map_id = Column(Integer, ForeignKey("maps.id"), nullable=False)
+    source = Column(String, nullable=False)
+    target = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    from_version = Column(Integer, nullable=False)
+    to_version = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_map_edges_map_id_source_target", "map_id", "source", "target", "to_version"),
+        Index("ix_map_edges_target", "target"),
+    )
+
 # Pydantic models for API
 class Component(BaseModel):
     id: str
     name: str
-    x: float
-    y: float
+    x: float  # Evolution (0-1)
+    y: float  # Value (0-1)
     description: Optional[str] = None
 
 class Relationship(BaseModel):
@@ -48,6 +95,31 @@ class MapVersion(BaseModel):
     relationships: List[Relationship]
     comment: Optional[str] = None
 
+class ComponentMove(BaseModel):
+    id: str
+    x: float
+    y: float
+
+class MapDiff(BaseModel):
+    moved: List[ComponentMove] = []
+    added_components: List[Component] = []
+    removed_components: List[str] = []
+    added_relationships: List[Relationship] = []
+    removed_relationships: List[Relationship] = []
+
+    def is_position_only(self) -> bool:
+        """Whether the diff only moves existing components."""
+        return not (
+            self.added_components or self.removed_components
+            or self.added_relationships or self.removed_relationships
+        )
+
+class IncrementalAnalysis(BaseModel):
+    base_hash: Optional[str] = None  # content hash returned by /analyze-map
+    map_id: Optional[int] = None  # or a stored version as the base
+    version: Optional[int] = None
+    diff: MapDiff
+
 class Map(BaseModel):
     name: str
     description: str
@@ -61,6 +133,8 @@ class StrategicRecommendation(BaseModel):
     impact: float  # 0-1
     effort: float  # 0-1
     rationale: str
+    rule: Optional[str] = None  # id of the analyzer rule that produced it
+    template: Optional[str] = None  # id of the shared recommendation template
 
 class MapAnalysis(BaseModel):
     components: dict
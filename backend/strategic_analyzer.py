@@ -1,6 +1,95 @@
-from typing import List, Dict
-import networkx as nx
-from models import StrategicRecommendation
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+from graph_metrics import GraphMetrics
+import instrumentation
+from map_graph import MapGraph
+
+# Rules whose outcome depends only on a component's own x/y position
+POSITION_RULES = {'genesis_investment', 'commodity_outsourcing', 'evolution'}
+
+def _template(template_id: str, rule: str, recommendation: str, priority: str, impact: float, effort: float, rationale: str) -> Dict:
+    return {
+        "recommendation": recommendation,
+        "priority": priority,
+        "impact": impact,
+        "effort": effort,
+        "rationale": rationale,
+        "rule": rule,
+        "template": template_id
+    }
+
+# The fixed fields of every kind of recommendation, keyed by template id.
+# A recommendation is its component_id plus a template, so building one
+# copies a dict instead of validating a model.
+RECOMMENDATION_TEMPLATES = {
+    template["template"]: template
+    for template in [
+        _template(
+            "genesis_investment", "genesis_investment",
+            "Consider investing in R&D to evolve this strategic component", "high", 0.9, 0.8,
+            "High-value components in genesis stage need rapid evolution"
+        ),
+        _template(
+            "commodity_outsourcing", "commodity_outsourcing",
+            "Consider outsourcing or using existing solutions", "medium", 0.7, 0.5,
+            "High-value commodity could be replaced with existing solutions"
+        ),
+        *(
+            _template(
+                f"evolution_{stage}", "evolution",
+                f"Consider evolving to {stage} stage", "medium", 0.6, 0.6,
+                f"Natural evolution path available to {stage}"
+            )
+            for stage in ('custom', 'product', 'commodity')
+        ),
+        _template(
+            "bottleneck", "bottleneck",
+            "Consider breaking down or duplicating this component", "high", 0.8, 0.7,
+            "Component is a potential bottleneck in the value chain"
+        ),
+        _template(
+            "isolated", "isolated",
+            "Consider integrating this isolated component", "medium", 0.5, 0.4,
+            "Isolated components may indicate missed opportunities"
+        ),
+        _template(
+            "circular_dependency", "circular_dependency",
+            "Consider breaking circular dependency", "high", 0.8, 0.7,
+            "Circular dependencies can cause maintenance issues"
+        ),
+        _template(
+            "strategic_cluster", "strategic_cluster",
+            "Consider creating a dedicated team for this strategic cluster", "high", 0.9, 0.8,
+            "These {size} strategic components should be managed together"
+        )
+    ]
+}
+
+def recommend(template_id: str, component_id: str) -> Dict:
+    return {"component_id": component_id, **RECOMMENDATION_TEMPLATES[template_id]}
+
+def compact_recommendations(recommendations: List[Dict]) -> Tuple[Dict[str, Dict], List[Dict]]:
+    """Split recommendations into the templates they use and per-component references.
+
+    Each reference holds component_id and template, plus any field whose
+    value differs from the template's (such as a cluster's rationale).
+    """
+    templates = {}
+    references = []
+    for rec in recommendations:
+        template_id = rec["template"]
+        template = templates.get(template_id)
+        if template is None:
+            template = templates[template_id] = {
+                field: value for field, value in RECOMMENDATION_TEMPLATES[template_id].items() if field != "template"
+            }
+        reference = {"component_id": rec["component_id"], "template": template_id}
+        for field, value in template.items():
+            if rec[field] != value:
+                reference[field] = rec[field]
+        references.append(reference)
+    return templates, references
 
 class StrategicAnalyzer:
     def __init__(self):
@@ -17,135 +106,102 @@ class StrategicAnalyzer:
             'high': 1.0
         }
 
-    def analyze_map(self, components: List[Dict], relationships: List[Dict]) -> List[StrategicRecommendation]:
-        """Generate strategic recommendations based on map analysis."""
+    @instrumentation.timed("analysis.strategic")
+    def analyze_map(
+        self,
+        graph: MapGraph,
+        metrics: Optional[GraphMetrics] = None,
+        clusters: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """Generate strategic recommendations based on map analysis.
+
+        If ``metrics`` is given, it must have been built on ``graph``; its
+        centralities are reused instead of recomputed. Likewise ``clusters``
+        from strategic_clusters.
+        """
         recommendations = []
-        G = self._create_graph(components, relationships)
+        if metrics is None:
+            metrics = GraphMetrics(graph)
         
-        # Analyze each component
-        for component in components:
-            recs = self._analyze_component(component, G, components)
+        # Analyze each component; endpoints that are not components have no position
+        positions = zip(graph.ids[:graph.component_count], graph.x.tolist(), graph.y.tolist())
+        for component_id, x, y in positions:
+            recs = self._analyze_component(component_id, x, y, metrics)
             recommendations.extend(recs)
         
         # Analyze overall map structure
-        structural_recs = self._analyze_structure(G, components)
+        structural_recs = self._analyze_structure(graph, metrics, clusters)
         recommendations.extend(structural_recs)
         
         return recommendations
 
-    def _analyze_component(self, component: Dict, G: nx.DiGraph, all_components: List[Dict]) -> List[StrategicRecommendation]:
+    def _analyze_component(self, component_id: str, x: float, y: float, metrics: GraphMetrics) -> List[Dict]:
         """Analyze individual component and generate recommendations."""
+        recommendations = self.position_recommendations(component_id, x, y)
+        
+        # Check for bottlenecks
+        if self._is_bottleneck(component_id, metrics):
+            recommendations.append(recommend("bottleneck", component_id))
+        
+        return recommendations
+
+    def position_recommendations(self, component_id: str, x: float, y: float) -> List[Dict]:
+        """Recommendations that depend only on the component's position."""
         recommendations = []
         
         # Check for strategic components in early evolution
-        if component['y'] > 0.75 and component['x'] < 0.25:
-            recommendations.append(StrategicRecommendation(
-                component_id=component['id'],
-                recommendation="Consider investing in R&D to evolve this strategic component",
-                priority="high",
-                impact=0.9,
-                effort=0.8,
-                rationale="High-value components in genesis stage need rapid evolution"
-            ))
+        if y > 0.75 and x < 0.25:
+            recommendations.append(recommend("genesis_investment", component_id))
         
         # Check for commodity components with high investment
-        if component['y'] > 0.75 and component['x'] > 0.75:
-            recommendations.append(StrategicRecommendation(
-                component_id=component['id'],
-                recommendation="Consider outsourcing or using existing solutions",
-                priority="medium",
-                impact=0.7,
-                effort=0.5,
-                rationale="High-value commodity could be replaced with existing solutions"
-            ))
-        
-        # Check for bottlenecks
-        if self._is_bottleneck(component['id'], G):
-            recommendations.append(StrategicRecommendation(
-                component_id=component['id'],
-                recommendation="Consider breaking down or duplicating this component",
-                priority="high",
-                impact=0.8,
-                effort=0.7,
-                rationale="Component is a potential bottleneck in the value chain"
-            ))
+        if y > 0.75 and x > 0.75:
+            recommendations.append(recommend("commodity_outsourcing", component_id))
         
         # Check for evolution opportunities
-        next_stage = self._get_next_evolution_stage(component['x'])
+        next_stage = self._get_next_evolution_stage(x)
         if next_stage:
-            recommendations.append(StrategicRecommendation(
-                component_id=component['id'],
-                recommendation=f"Consider evolving to {next_stage} stage",
-                priority="medium",
-                impact=0.6,
-                effort=0.6,
-                rationale=f"Natural evolution path available to {next_stage}"
-            ))
+            recommendations.append(recommend(f"evolution_{next_stage}", component_id))
         
         return recommendations
 
-    def _analyze_structure(self, G: nx.DiGraph, components: List[Dict]) -> List[StrategicRecommendation]:
+    def _analyze_structure(
+        self,
+        graph: MapGraph,
+        metrics: GraphMetrics,
+        clusters: Optional[List[Dict]] = None
+    ) -> List[Dict]:
         """Analyze overall map structure and generate recommendations."""
         recommendations = []
         
         # Check for isolated components
-        isolated = list(nx.isolates(G))
+        isolated = metrics.isolates
         if isolated:
             for component_id in isolated:
-                recommendations.append(StrategicRecommendation(
-                    component_id=component_id,
-                    recommendation="Consider integrating this isolated component",
-                    priority="medium",
-                    impact=0.5,
-                    effort=0.4,
-                    rationale="Isolated components may indicate missed opportunities"
-                ))
+                recommendations.append(recommend("isolated", component_id))
         
-        # Check for circular dependencies
-        cycles = list(nx.simple_cycles(G))
-        if cycles:
-            for cycle in cycles:
-                recommendations.append(StrategicRecommendation(
-                    component_id=cycle[0],
-                    recommendation="Consider breaking circular dependency",
-                    priority="high",
-                    impact=0.8,
-                    effort=0.7,
-                    rationale="Circular dependencies can cause maintenance issues"
-                ))
+        # Check for circular dependencies, one recommendation per cluster
+        for cluster in metrics.cycles["clusters"]:
+            recommendations.append(recommend("circular_dependency", cluster[0]))
         
         # Check for strategic clusters
-        clusters = self._identify_strategic_clusters(G, components)
-        for cluster in clusters:
-            recommendations.append(StrategicRecommendation(
-                component_id=cluster[0],
-                recommendation="Consider creating a dedicated team for this strategic cluster",
-                priority="high",
-                impact=0.9,
-                effort=0.8,
-                rationale="Strategic components should be managed together"
-            ))
+        if clusters is None:
+            clusters = self.strategic_clusters(graph)
+        recommendations.extend(self.cluster_recommendations(clusters))
         
         return recommendations
 
-    def _create_graph(self, components: List[Dict], relationships: List[Dict]) -> nx.DiGraph:
-        """Create a directed graph from components and relationships."""
-        G = nx.DiGraph()
-        
-        # Add nodes
-        for component in components:
-            G.add_node(component['id'], **component)
-        
-        # Add edges
-        for rel in relationships:
-            G.add_edge(rel['source'], rel['target'], type=rel['type'])
-        
-        return G
+    def cluster_recommendations(self, clusters: List[Dict]) -> List[Dict]:
+        """Recommendations for clusters of connected strategic components."""
+        recommendations = []
+        for cluster in clusters:
+            rec = recommend("strategic_cluster", cluster["component_ids"][0])
+            rec["rationale"] = rec["rationale"].format(size=cluster["size"])
+            recommendations.append(rec)
+        return recommendations
 
-    def _is_bottleneck(self, component_id: str, G: nx.DiGraph) -> bool:
+    def _is_bottleneck(self, component_id: str, metrics: GraphMetrics) -> bool:
         """Check if a component is a bottleneck."""
-        betweenness = nx.betweenness_centrality(G)
-        return betweenness.get(component_id, 0) > 0.5
+        return metrics.betweenness.get(component_id, 0) > 0.5
 
     def _get_next_evolution_stage(self, current_x: float) -> str:
         """Determine the next evolution stage."""
@@ -157,17 +213,36 @@ class StrategicAnalyzer:
             return 'commodity'
         return None
 
-    def _identify_strategic_clusters(self, G: nx.DiGraph, components: List[Dict]) -> List[List[str]]:
-        """Identify clusters of strategic components."""
-        strategic_components = [c['id'] for c in components if c['y'] > 0.75]
+    @instrumentation.timed("analysis.clusters")
+    def strategic_clusters(self, graph: MapGraph) -> List[Dict]:
+        """Find groups of connected high-value components.
+
+        A cluster is a connected component, ignoring edge direction, of the
+        subgraph induced by components valued above the 'medium' threshold,
+        with at least two members. Each cluster appears once, ordered by its
+        first component in map order, with its size and mean value and
+        evolution.
+        """
+        nodes = np.flatnonzero(graph.y > self.value_thresholds['medium'])
+        if len(nodes) < 2:
+            return []
+        induced = graph.adjacency[nodes][:, nodes]
+        count, labels = connected_components(induced, directed=True, connection='weak')
+        sizes = np.bincount(labels, minlength=count)
+        value_totals = np.bincount(labels, weights=graph.y[nodes], minlength=count)
+        evolution_totals = np.bincount(labels, weights=graph.x[nodes], minlength=count)
+
+        # Group members by label with one stable sort, keeping map order within each group
+        members = np.split(nodes[np.argsort(labels, kind='stable')], np.cumsum(sizes)[:-1])
         clusters = []
-        
-        for comp_id in strategic_components:
-            cluster = [comp_id]
-            neighbors = list(G.neighbors(comp_id))
-            strategic_neighbors = [n for n in neighbors if n in strategic_components]
-            if strategic_neighbors:
-                cluster.extend(strategic_neighbors)
-                clusters.append(cluster)
-        
+        for label, cluster_nodes in enumerate(members):
+            if sizes[label] < 2:
+                continue
+            clusters.append({
+                "component_ids": [graph.ids[i] for i in cluster_nodes.tolist()],
+                "size": int(sizes[label]),
+                "average_value": float(value_totals[label] / sizes[label]),
+                "average_evolution": float(evolution_totals[label] / sizes[label])
+            })
+        clusters.sort(key=lambda cluster: graph.index[cluster["component_ids"][0]])
         return clusters
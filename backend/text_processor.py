@@ -3,21 +3,322 @@ from nltk.tokenize import sent_tokenize, word_tokenize
 from nltk.tag import pos_tag
 from nltk.chunk import ne_chunk
 from nltk.corpus import wordnet
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Iterable, Iterator, Tuple, Optional
+import logging
+import os
 import re
+import threading
 import spacy
+from spacy.matcher import PhraseMatcher
 from collections import defaultdict
+import instrumentation
 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('maxent_ne_chunker')
-nltk.download('words')
-nltk.download('wordnet')
+logger = logging.getLogger(__name__)
+
+# NLTK data is installed at image build time; only check for it here
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'maxent_ne_chunker': 'chunkers/maxent_ne_chunker',
+    'words': 'corpora/words',
+    'wordnet': 'corpora/wordnet'
+}
+
+# Pipeline components the processor never reads from
+UNUSED_PIPES = ['ner', 'lemmatizer']
+
+# Defaults for batch extraction through nlp.pipe
+BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", "32"))
+N_PROCESS = int(os.getenv("NLP_N_PROCESS", "1"))
+
+# Longer texts are parsed as a sequence of sentence-aligned chunks of at most this many characters
+CHUNK_CHARS = int(os.getenv("NLP_CHUNK_CHARS", "50000"))
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s+|\n\s*\n')
+
+# Order of the dimensions scored by TextProcessor.keyword_scorer
+SCORE_DIMENSIONS = ('evolution', 'value', 'maturity')
+
+# Trigger label of "without <source>, <target> cannot"
+NEGATED_DEPENDENCY = 'without'
+
+# Longest component name, in tokens, that relationship sites keep context for
+MENTION_TOKENS = 8
+
+# A relationship site is the text around a relationship phrase or verb, lowercased
+# tokens only, so it can be resolved once its component names are known:
+#   ('phrase', type, tokens before, tokens after)
+#   ('without', tokens after)
+#   ('verb', type, subject windows, object windows), each window (tokens, argument offset)
+Site = Tuple
+
+WARM_UP_TEXT = "The customer platform depends on a reliable database."
+
+def check_nltk_data() -> List[str]:
+    """Return the names of NLTK resources missing from the local data path."""
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+class KeywordScorer:
+    """Scores text on several keyword dimensions in one pass.
+
+    Each dimension maps a category to its single-word keywords and score. A
+    context is split into words with one compiled regex and intersected with
+    the combined keyword set, so it is scanned once for every dimension and
+    only whole words match ("new" no longer matches inside "renewal").
+    """
+
+    def __init__(self, dimensions: List[Dict[str, Tuple[List[str], float]]]):
+        self.dimension_count = len(dimensions)
+        self.keyword_hits: Dict[str, List[Tuple[int, str, float]]] = defaultdict(list)
+        for dimension, categories in enumerate(dimensions):
+            for category, (keywords, score) in categories.items():
+                for keyword in keywords:
+                    self.keyword_hits[keyword].append((dimension, category, score))
+        self.keywords = frozenset(self.keyword_hits)
+        self.word_pattern = re.compile(r'\w+')
+
+    def hits(self, context: str) -> Iterable[Tuple[int, str, float]]:
+        """The (dimension, category, score) hits of one context.
+
+        Each matched category counts once, however many of its keywords appear.
+        """
+        matched = self.keywords.intersection(self.word_pattern.findall(context.lower()))
+        if not matched:
+            return ()
+        if len(matched) == 1:
+            return self.keyword_hits[next(iter(matched))]
+        # Sorted so scores are summed in the same order whatever the hash seed
+        return sorted({hit for keyword in matched for hit in self.keyword_hits[keyword]})
+
+    def score(self, contexts: List[str], default: float = 0.5) -> List[float]:
+        """Average score per dimension over all contexts."""
+        scores = [[] for _ in range(self.dimension_count)]
+        for context in contexts:
+            for dimension, _, score in self.hits(context):
+                scores[dimension].append(score)
+        return [sum(s) / len(s) if s else default for s in scores]
+
+def chunk_bounds(text: str, chunk_chars: int = CHUNK_CHARS) -> List[Tuple[int, int]]:
+    """(start, end) offsets splitting text into chunks of whole sentences.
+
+    A chunk ends at the last sentence boundary within ``chunk_chars``; a
+    sentence longer than that is cut at whitespace, or at the limit.
+    """
+    bounds = []
+    start = 0
+    while len(text) - start > chunk_chars:
+        limit = start + chunk_chars
+        end = None
+        for match in SENTENCE_END.finditer(text, start, limit):
+            end = match.end()
+        if end is None:
+            end = text.rfind(' ', start, limit) + 1 or limit
+        bounds.append((start, end))
+        start = end
+    if start < len(text):
+        bounds.append((start, len(text)))
+    return bounds
+
+def resolve_relationships(candidates: Iterable[Tuple[str, str, str]], components: List[Dict]) -> List[Dict]:
+    """Keep the relationship candidates whose ends are both known components."""
+    relationships = []
+    component_ids = {c['name'].lower(): c['id'] for c in components}
+    seen_relationships = set()
+    for source, target, rel_type in candidates:
+        source = source.strip()
+        target = target.strip()
+        if source in component_ids and target in component_ids:
+            key = (component_ids[source], component_ids[target], rel_type)
+            if key not in seen_relationships:
+                seen_relationships.add(key)
+                relationships.append({'source': key[0], 'target': key[1], 'type': rel_type})
+    return relationships
+
+def _name_at(tokens: Tuple[str, ...], start: int, name_tokens: Dict[Tuple[str, ...], str]) -> Tuple[Optional[str], int]:
+    """The longest name starting at tokens[start], and the offset after it."""
+    for length in range(min(MENTION_TOKENS, len(tokens) - start), 0, -1):
+        name = name_tokens.get(tokens[start:start + length])
+        if name is not None:
+            return name, start + length
+    return None, start
+
+def _name_ending(tokens: Tuple[str, ...], name_tokens: Dict[Tuple[str, ...], str]) -> Optional[str]:
+    """The longest name that ends the tokens."""
+    for length in range(min(MENTION_TOKENS, len(tokens)), 0, -1):
+        name = name_tokens.get(tokens[len(tokens) - length:])
+        if name is not None:
+            return name
+    return None
+
+def _name_covering(window: Tuple[Tuple[str, ...], int], name_tokens: Dict[Tuple[str, ...], str]) -> Optional[str]:
+    """The longest, then earliest, name that covers the window's argument token."""
+    tokens, center = window
+    for length in range(min(MENTION_TOKENS, len(tokens)), 0, -1):
+        for start in range(max(0, center - length + 1), min(center, len(tokens) - length) + 1):
+            name = name_tokens.get(tokens[start:start + length])
+            if name is not None:
+                return name
+    return None
+
+def site_candidates(site: Site, name_tokens: Dict[Tuple[str, ...], str]) -> Tuple[List[Tuple[str, str, str]], bool]:
+    """(source, target, type) pairs of component names related at a site.
+
+    Also returns whether every end of the site was a known name, after
+    which more names cannot change what it relates.
+    """
+    if site[0] == 'phrase':
+        _, rel_type, before, after = site
+        source = _name_ending(before, name_tokens)
+        target, _ = _name_at(after, 0, name_tokens)
+        if source is None or target is None:
+            return [], False
+        return [(source, target, rel_type)], True
+    if site[0] == NEGATED_DEPENDENCY:
+        after = site[1]
+        source, i = _name_at(after, 0, name_tokens)
+        if source is None or after[i:i + 1] != (',',):
+            return [], False
+        target, i = _name_at(after, i + 1, name_tokens)
+        if target is None or not "".join(after[i:i + 2]).startswith('cannot'):
+            return [], False
+        return [(source, target, 'depends_on')], True
+    _, rel_type, subject_windows, object_windows = site
+    subjects = [_name_covering(w, name_tokens) for w in subject_windows]
+    objects = [_name_covering(w, name_tokens) for w in object_windows]
+    candidates = [
+        (subj, obj, rel_type)
+        for subj in subjects if subj is not None
+        for obj in objects if obj is not None
+    ]
+    return candidates, None not in subjects and None not in objects
+
+def relationship_candidates(sites: Iterable[Site], name_tokens: Dict[Tuple[str, ...], str]) -> Iterator[Tuple[str, str, str]]:
+    """(source, target, type) pairs of component names related at the sites.
+
+    ``name_tokens`` maps each name's lowercased tokens to the name.
+    """
+    for site in sites:
+        yield from site_candidates(site, name_tokens)[0]
+
+class MapAccumulator:
+    """Running extraction state of a document parsed in chunks.
+
+    Keeps score totals and only the longest context per component. A
+    relationship site is resolved as soon as both its ends are known names
+    and then dropped; sites with an end that is not a name yet are kept, and
+    retried as names are added, so a relationship is found even when its ends
+    are first named in later chunks. Memory thus grows with the number of
+    components and relationships, plus the distinct sites that relate
+    something other than a component, such as a pronoun subject, of at most
+    a few dozen tokens each. Accumulators of consecutive chunks merge in
+    document order.
+    """
+
+    def __init__(self):
+        # name -> [score totals, score counts, longest context], in order of first mention
+        self.mentions: Dict[str, List] = {}
+        # lowercased tokens of a name -> lowercased name
+        self.name_tokens: Dict[Tuple[str, ...], str] = {}
+        # (source, target, type) of the resolved sites, in order found
+        self.relationships: Dict[Tuple[str, str, str], None] = {}
+        # Sites with an end that is not a known name yet
+        self.relationship_sites: Dict[Site, None] = {}
+        # Number of names the kept sites were last resolved against
+        self.names_resolved = 0
+
+    def add_mention(self, name: str, tokens: Tuple[str, ...], context: str, hits: Iterable[Tuple[int, str, float]]) -> None:
+        entry = self.mentions.get(name)
+        if entry is None:
+            entry = self.mentions[name] = [[0] * len(SCORE_DIMENSIONS), [0] * len(SCORE_DIMENSIONS), context]
+            self.name_tokens.setdefault(tokens, name.lower())
+        elif len(context) > len(entry[2]):
+            entry[2] = context
+        for dimension, _, score in hits:
+            entry[0][dimension] += score
+            entry[1][dimension] += 1
+
+    def merge(self, other: "MapAccumulator") -> None:
+        """Add the state of the chunk that follows this one."""
+        for name, (totals, counts, context) in other.mentions.items():
+            entry = self.mentions.get(name)
+            if entry is None:
+                self.mentions[name] = [totals, counts, context]
+                continue
+            if len(context) > len(entry[2]):
+                entry[2] = context
+            for dimension in range(len(SCORE_DIMENSIONS)):
+                entry[0][dimension] += totals[dimension]
+                entry[1][dimension] += counts[dimension]
+        for tokens, name in other.name_tokens.items():
+            self.name_tokens.setdefault(tokens, name)
+        self.relationships.update(other.relationships)
+        self.add_sites(other.relationship_sites)
+
+    def add_sites(self, sites: Iterable[Site]) -> None:
+        """Resolve relationship sites, keeping those with an end that is not a known name."""
+        if len(self.name_tokens) > self.names_resolved:
+            self.relationship_sites = {
+                site: None for site in self.relationship_sites if not self._resolve(site)
+            }
+            self.names_resolved = len(self.name_tokens)
+        for site in sites:
+            if site not in self.relationship_sites and not self._resolve(site):
+                self.relationship_sites[site] = None
+
+    def _resolve(self, site: Site) -> bool:
+        candidates, resolved = site_candidates(site, self.name_tokens)
+        self.relationships.update(dict.fromkeys(candidates))
+        return resolved
+
+    def components(self) -> List[Dict]:
+        """One component per id, in order of first mention.
+
+        Names that only differ in case or spacing, like "Database" and
+        "database", share an id and so are scored as one component under the
+        first name seen.
+        """
+        by_id: Dict[str, List] = {}
+        for name, (totals, counts, context) in self.mentions.items():
+            component_id = name.lower().replace(' ', '_')
+            entry = by_id.get(component_id)
+            if entry is None:
+                by_id[component_id] = [name, list(totals), list(counts), context]
+                continue
+            if len(context) > len(entry[3]):
+                entry[3] = context
+            for dimension in range(len(SCORE_DIMENSIONS)):
+                entry[1][dimension] += totals[dimension]
+                entry[2][dimension] += counts[dimension]
+
+        components = []
+        for component_id, (name, totals, counts, context) in by_id.items():
+            evolution, value, maturity = (
+                total / count if count else 0.5 for total, count in zip(totals, counts)
+            )
+            
+            # Adjust position based on maturity and context
+            components.append({
+                'id': component_id,
+                'name': name,
+                'x': (evolution + maturity) / 2,
+                'y': value,
+                'description': f"{name}: {context}"
+            })
+        return components
+
+    def result(self) -> Tuple[List[Dict], List[Dict]]:
+        """The components and relationships found so far."""
+        components = self.components()
+        return components, resolve_relationships(self.relationships, components)
 
 class TextProcessor:
     def __init__(self):
-        self.nlp = spacy.load('en_core_web_sm')
+        self.nlp = spacy.load('en_core_web_sm', exclude=UNUSED_PIPES)
         
         self.evolution_keywords = {
             'genesis': ['new', 'novel', 'innovative', 'emerging', 'undefined', 'experimental', 'research'],
@@ -32,82 +333,179 @@ class TextProcessor:
             'low': ['supporting', 'auxiliary', 'optional', 'supplementary', 'peripheral']
         }
         
-        self.relationship_patterns = {
+        self.evolution_scores = {'genesis': 0.1, 'custom': 0.4, 'product': 0.7, 'commodity': 0.9}
+        self.value_scores = {'high': 0.9, 'medium': 0.5, 'low': 0.2}
+        self.maturity_indicators = {
+            'new': 0.1,
+            'developing': 0.3,
+            'stable': 0.6,
+            'mature': 0.8,
+            'legacy': 0.9
+        }
+        
+        # Evolution, value and maturity are scored together in one pass per context
+        self.keyword_scorer = KeywordScorer([
+            {stage: (keywords, self.evolution_scores[stage]) for stage, keywords in self.evolution_keywords.items()},
+            {value: (keywords, self.value_scores[value]) for value, keywords in self.value_keywords.items()},
+            {indicator: ([indicator], score) for indicator, score in self.maturity_indicators.items()}
+        ])
+        
+        # Phrases that relate the component mention just before them to the one just after
+        self.relationship_phrases = {
             'depends_on': [
-                r'(\w+)\s+(?:depends on|requires|needs|uses|relies on|based on)\s+(\w+)',
-                r'(\w+)\s+(?:is dependent on|is reliant on)\s+(\w+)',
-                r'without\s+(\w+),\s+(\w+)\s+cannot'
+                'depends on', 'requires', 'needs', 'uses', 'relies on', 'based on',
+                'is dependent on', 'is reliant on'
             ],
             'provides': [
-                r'(\w+)\s+(?:provides|supports|enables|serves|helps)\s+(\w+)',
-                r'(\w+)\s+(?:is provided by|is supported by|is enabled by)\s+(\w+)',
-                r'(\w+)\s+(?:enhances|improves|optimizes)\s+(\w+)'
+                'provides', 'supports', 'enables', 'serves', 'helps',
+                'is provided by', 'is supported by', 'is enabled by',
+                'enhances', 'improves', 'optimizes'
             ],
             'consists_of': [
-                r'(\w+)\s+(?:consists of|contains|includes|comprises)\s+(\w+)',
-                r'(\w+)\s+(?:is part of|belongs to)\s+(\w+)',
+                'consists of', 'contains', 'includes', 'comprises',
+                'is part of', 'belongs to'
             ]
         }
 
-    def extract_components(self, text: str) -> List[Dict]:
-        """Extract components and their properties from text using advanced NLP."""
-        doc = self.nlp(text)
-        components = []
-        component_mentions = defaultdict(list)
-        
-        # First pass: identify components and gather context
+        # Matched over a document's tokens in one pass, however many phrases there are
+        self.relationship_matcher = PhraseMatcher(self.nlp.vocab, attr='LOWER')
+        for rel_type, phrases in self.relationship_phrases.items():
+            self.relationship_matcher.add(rel_type, [self.nlp.make_doc(phrase) for phrase in phrases])
+        self.relationship_matcher.add(NEGATED_DEPENDENCY, [self.nlp.make_doc(NEGATED_DEPENDENCY)])
+
+    def process(self, text: str, chunk_chars: Optional[int] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Extract components and relationships, parsing each part of the text once.
+
+        Texts longer than ``chunk_chars`` are streamed through the pipeline in
+        sentence-aligned chunks, so only one chunk's parse is held at a time.
+        """
+        accumulator = MapAccumulator()
+        chunks = (text[start:end] for start, end in chunk_bounds(text, chunk_chars or CHUNK_CHARS))
+        for doc in instrumentation.timed_iter("nlp.parse", self.nlp.pipe(chunks, batch_size=1)):
+            with instrumentation.stage("nlp.extract"):
+                self.accumulate(doc, accumulator)
+        return accumulator.result()
+
+    def accumulate(self, doc, accumulator: MapAccumulator) -> MapAccumulator:
+        """Add a parsed document or chunk to a running extraction."""
         for sent in doc.sents:
             for chunk in sent.noun_chunks:
                 if self._is_valid_component(chunk):
-                    comp_name = chunk.text
                     context = self._get_context_window(sent, chunk)
-                    component_mentions[comp_name].append(context)
-        
-        # Second pass: analyze components with all their mentions
-        for comp_name, contexts in component_mentions.items():
-            evolution = self._determine_evolution(contexts)
-            value = self._determine_value(contexts)
-            maturity = self._analyze_component_maturity(contexts)
-            
-            # Adjust position based on maturity and context
-            final_x = (evolution + maturity) / 2
-            final_y = value
-            
-            components.append({
-                'id': comp_name.lower().replace(' ', '_'),
-                'name': comp_name,
-                'x': final_x,
-                'y': final_y,
-                'description': self._generate_component_description(comp_name, contexts)
-            })
-        
-        return components
+                    tokens = tuple(token.lower_ for token in chunk)
+                    accumulator.add_mention(chunk.text, tokens, context, self.keyword_scorer.hits(context))
+        accumulator.add_sites(self._relationship_sites(doc))
+        return accumulator
+
+    def extract_batch(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        n_process: Optional[int] = None
+    ) -> List[Tuple[List[Dict], List[Dict]]]:
+        """Extract components and relationships for many texts, in input order.
+
+        Documents are streamed through ``nlp.pipe``; ``n_process`` > 1 parses
+        them in worker processes. Long texts are split into sentence-aligned
+        chunks as in ``process``, which also keeps each within the
+        pipeline's max_length.
+        """
+        batch_size = batch_size or BATCH_SIZE
+        n_process = min(n_process or N_PROCESS, os.cpu_count() or 1, max(len(texts), 1))
+        accumulators = [MapAccumulator() for _ in texts]
+        chunks = (
+            (text[start:end], index)
+            for index, text in enumerate(texts)
+            for start, end in chunk_bounds(text, CHUNK_CHARS)
+        )
+        docs = self.nlp.pipe(chunks, batch_size=batch_size, n_process=n_process, as_tuples=True)
+        for doc, index in instrumentation.timed_iter("nlp.parse", docs):
+            with instrumentation.stage("nlp.extract"):
+                self.accumulate(doc, accumulators[index])
+        return [accumulator.result() for accumulator in accumulators]
+
+    def extract_components(self, text: str) -> List[Dict]:
+        """Extract components and their properties from text using advanced NLP."""
+        return self._components_from_doc(self.nlp(text))
 
     def extract_relationships(self, text: str, components: List[Dict]) -> List[Dict]:
         """Extract relationships between components using advanced pattern matching."""
-        doc = self.nlp(text)
-        relationships = []
-        component_ids = {c['name'].lower(): c['id'] for c in components}
-        seen_relationships = set()
-        
-        # Extract explicit relationships
-        for rel_type, patterns in self.relationship_patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, text.lower())
-                for match in matches:
-                    source, target = match.groups()
-                    rel = self._create_relationship(source, target, rel_type, component_ids)
-                    if rel and self._is_new_relationship(rel, seen_relationships):
-                        relationships.append(rel)
-                        seen_relationships.add((rel['source'], rel['target'], rel['type']))
-        
-        # Extract implicit relationships from sentence structure
+        return self._relationships_from_doc(self.nlp(text), components)
+
+    def _components_from_doc(self, doc) -> List[Dict]:
+        """Extract components and their properties from a parsed document."""
+        return self.accumulate(doc, MapAccumulator()).components()
+
+    def _relationships_from_doc(self, doc, components: List[Dict]) -> List[Dict]:
+        """Extract relationships between components from a parsed document."""
+        name_tokens = {}
+        for c in components:
+            name = c['name'].lower()
+            name_tokens.setdefault(tuple(token.lower_ for token in self.nlp.make_doc(name)), name)
+        return resolve_relationships(relationship_candidates(self._relationship_sites(doc), name_tokens), components)
+
+    def _relationship_sites(self, doc) -> Iterator[Site]:
+        """Where the document relates two things, with the tokens around them.
+
+        Relationship phrases are found in one PhraseMatcher pass and verbs by
+        part of speech; each site keeps at most MENTION_TOKENS tokens of
+        its sentence on either side, so which names it relates can be decided
+        once those names are known, wherever in the text they first appear.
+        """
+        lowers = tuple(token.lower_ for token in doc)
+        sentence_start = [0] * len(doc)
+        sentence_end = [0] * len(doc)
         for sent in doc.sents:
-            root = sent.root
-            if root.pos_ == 'VERB':
-                self._extract_relationships_from_verb(root, relationships, component_ids, seen_relationships)
+            for i in range(sent.start, sent.end):
+                sentence_start[i] = sent.start
+                sentence_end[i] = sent.end
+        
+        # Explicit relationships: "<source> depends on <target>", "without <source>, <target> cannot"
+        for match_id, start, end in sorted(self.relationship_matcher(doc), key=lambda match: match[1]):
+            rel_type = self.nlp.vocab.strings[match_id]
+            if end >= len(doc):
+                continue
+            if rel_type == NEGATED_DEPENDENCY:
+                yield NEGATED_DEPENDENCY, lowers[end:min(sentence_end[start], end + 2 * MENTION_TOKENS + 3)]
+                continue
+            if start > sentence_start[start]:
+                yield (
+                    'phrase',
+                    rel_type,
+                    lowers[max(sentence_start[start], start - MENTION_TOKENS):start],
+                    lowers[end:min(sentence_end[start], end + MENTION_TOKENS)]
+                )
         
-        return relationships
+        # Implicit relationships from the subjects and objects of every verb
+        for token in doc:
+            if token.pos_ == 'VERB':
+                site = self._verb_site(token, lowers, sentence_start, sentence_end)
+                if site is not None:
+                    yield site
+
+    def _verb_site(self, verb, lowers: Tuple[str, ...], sentence_start: List[int], sentence_end: List[int]) -> Optional[Site]:
+        """The subjects and objects of a verb, if it has both."""
+        subjects = [token.i for token in verb.lefts if token.dep_ == 'nsubj']
+        objects = []
+        for token in verb.rights:
+            if token.dep_ in ['dobj', 'pobj']:
+                objects.append(token.i)
+            elif token.dep_ == 'prep':
+                # "relies on X": the object hangs off the preposition
+                objects.extend(child.i for child in token.rights if child.dep_ == 'pobj')
+        if not subjects or not objects:
+            return None
+
+        def window(i: int) -> Tuple[Tuple[str, ...], int]:
+            start = max(sentence_start[i], i - MENTION_TOKENS + 1)
+            return lowers[start:min(sentence_end[i], i + MENTION_TOKENS)], i - start
+
+        return (
+            'verb',
+            self._determine_relationship_type(verb.text),
+            tuple(window(i) for i in subjects),
+            tuple(window(i) for i in objects)
+        )
 
     def _is_valid_component(self, chunk) -> bool:
         """Check if a noun chunk is a valid component."""
@@ -119,99 +517,10 @@ class TextProcessor:
 
     def _get_context_window(self, sentence, chunk, window_size: int = 5) -> str:
         """Get the surrounding context of a component mention."""
-        start = max(0, chunk.start - window_size)
-        end = min(len(sentence), chunk.end + window_size)
-        return sentence[start:end].text
-
-    def _determine_evolution(self, contexts: List[str]) -> float:
-        """Determine evolution stage based on all mentions of a component."""
-        scores = []
-        for context in contexts:
-            context = context.lower()
-            for stage, keywords in self.evolution_keywords.items():
-                if any(keyword in context for keyword in keywords):
-                    if stage == 'genesis':
-                        scores.append(0.1)
-                    elif stage == 'custom':
-                        scores.append(0.4)
-                    elif stage == 'product':
-                        scores.append(0.7)
-                    else:  # commodity
-                        scores.append(0.9)
-        
-        return sum(scores) / len(scores) if scores else 0.5
-
-    def _determine_value(self, contexts: List[str]) -> float:
-        """Determine value based on all mentions of a component."""
-        scores = []
-        for context in contexts:
-            context = context.lower()
-            for value, keywords in self.value_keywords.items():
-                if any(keyword in context for keyword in keywords):
-                    if value == 'high':
-                        scores.append(0.9)
-                    elif value == 'medium':
-                        scores.append(0.5)
-                    else:  # low
-                        scores.append(0.2)
-        
-        return sum(scores) / len(scores) if scores else 0.5
-
-    def _analyze_component_maturity(self, contexts: List[str]) -> float:
-        """Analyze the maturity of a component based on its context."""
-        maturity_indicators = {
-            'new': 0.1,
-            'developing': 0.3,
-            'stable': 0.6,
-            'mature': 0.8,
-            'legacy': 0.9
-        }
-        
-        scores = []
-        for context in contexts:
-            context = context.lower()
-            for indicator, score in maturity_indicators.items():
-                if indicator in context:
-                    scores.append(score)
-        
-        return sum(scores) / len(scores) if scores else 0.5
-
-    def _generate_component_description(self, name: str, contexts: List[str]) -> str:
-        """Generate a comprehensive description of a component."""
-        # Use the most informative context
-        best_context = max(contexts, key=len)
-        return f"{name}: {best_context}"
-
-    def _create_relationship(self, source: str, target: str, rel_type: str, component_ids: Dict[str, str]) -> Dict:
-        """Create a relationship if both components exist."""
-        source = source.strip()
-        target = target.strip()
-        
-        if source in component_ids and target in component_ids:
-            return {
-                'source': component_ids[source],
-                'target': component_ids[target],
-                'type': rel_type
-            }
-        return None
-
-    def _is_new_relationship(self, rel: Dict, seen: Set[Tuple]) -> bool:
-        """Check if this is a new relationship."""
-        return (rel['source'], rel['target'], rel['type']) not in seen
-
-    def _extract_relationships_from_verb(self, verb, relationships: List, component_ids: Dict, seen: Set):
-        """Extract relationships based on verb dependencies."""
-        subjects = [token for token in verb.lefts if token.dep_ == 'nsubj']
-        objects = [token for token in verb.rights if token.dep_ in ['dobj', 'pobj']]
-        
-        for subj in subjects:
-            for obj in objects:
-                if subj.text.lower() in component_ids and obj.text.lower() in component_ids:
-                    rel_type = self._determine_relationship_type(verb.text)
-                    rel = self._create_relationship(subj.text, obj.text, rel_type, component_ids)
-                    if rel and self._is_new_relationship(rel, seen):
-                        relationships.append(rel)
-                        seen.add((rel['source'], rel['target'], rel['type']))
+        # Token offsets are relative to the document, not the sentence
+        start = max(sentence.start, chunk.start - window_size)
+        end = min(sentence.end, chunk.end + window_size)
+        return sentence.doc[start:end].text
 
     def _determine_relationship_type(self, verb: str) -> str:
         """Determine relationship type based on verb semantics."""
@@ -223,3 +532,53 @@ class TextProcessor:
         elif verb in ['contains', 'includes', 'comprises']:
             return 'consists_of'
         return 'depends_on'  # default relationship type
+
+
+_processor: Optional[TextProcessor] = None
+_processor_lock = threading.Lock()
+_ready = threading.Event()
+
+def get_text_processor() -> TextProcessor:
+    """Return the process-wide TextProcessor, loading the model on first use."""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = TextProcessor()
+    return _processor
+
+def warm_up() -> None:
+    """Load the shared processor and run a sample document through it."""
+    missing = check_nltk_data()
+    if missing:
+        logger.warning("NLTK resources not installed: %s", ", ".join(missing))
+    processor = get_text_processor()
+    processor.nlp(WARM_UP_TEXT)
+    _ready.set()
+
+def is_ready() -> bool:
+    """Whether the shared processor has been loaded and warmed up."""
+    return _ready.is_set()
+
+def process_text(text: str) -> Tuple[List[Dict], List[Dict]]:
+    """Extract a map with the shared processor; entry point for worker processes."""
+    return get_text_processor().process(text)
+
+def process_chunk(text: str) -> MapAccumulator:
+    """Parse one chunk of a longer text; entry point for worker processes.
+
+    Returns the chunk's accumulator for the caller to merge in order.
+    """
+    processor = get_text_processor()
+    with instrumentation.stage("nlp.parse"):
+        doc = processor.nlp(text)
+    with instrumentation.stage("nlp.extract"):
+        return processor.accumulate(doc, MapAccumulator())
+
+def process_batch(texts: List[str], batch_size: Optional[int] = None) -> List[Tuple[List[Dict], List[Dict]]]:
+    """Extract many maps with the shared processor; entry point for worker processes.
+
+    Parses in the calling worker only: processes started from inside the
+    pool would escape its size and saturation limits.
+    """
+    return get_text_processor().extract_batch(texts, batch_size=batch_size, n_process=1)
@@ -0,0 +1,144 @@
+"""Position time series of map components, replayed from the version history.
+
+A map's versions are read once, in version order through a server-side
+cursor, and the delta chain is applied to arrays of current positions
+instead of rebuilding each version's content. Series come back as columnar
+NumPy arrays, with NaN where a component is absent from a version.
+"""
+import os
+from typing import Collection, Dict, Iterable, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from models import MapVersionDB
+import instrumentation
+import version_store
+
+# Version rows fetched per round trip while replaying
+TRAJECTORY_FETCH_SIZE = int(os.getenv("TRAJECTORY_FETCH_SIZE", "500"))
+
+def replay_positions(rows: Iterable, low: int = 1, component_ids: Optional[Collection[str]] = None) -> Dict:
+    """Positions of components at every version from ``low``.
+
+    ``rows`` are version rows in ascending order starting at a snapshot, as
+    selected by version_store.version_chain with created_at. Only the ids in
+    ``component_ids`` are tracked if given. Returns versions, timestamps,
+    component ids and names (latest seen) and (versions x components) x/y
+    arrays.
+    """
+    columns: Dict[str, int] = {}
+    names = []
+    current = np.full((2, 16), np.nan)
+    versions = []
+    timestamps = []
+    positions = []
+    for row in rows:
+        if row.delta is None:
+            current[:] = np.nan
+            placed = row.components or []
+        else:
+            for component_id in row.delta["components"]["removed"]:
+                column = columns.get(component_id)
+                if column is not None:
+                    current[:, column] = np.nan
+            placed = row.delta["components"]["added"] + row.delta["components"]["changed"]
+        for component in placed:
+            if component_ids is not None and component["id"] not in component_ids:
+                continue
+            column = columns.get(component["id"])
+            if column is None:
+                column = columns[component["id"]] = len(names)
+                names.append(component["name"])
+                if column == current.shape[1]:
+                    current = np.hstack([current, np.full_like(current, np.nan)])
+            names[column] = component["name"]
+            current[0, column] = component["x"]
+            current[1, column] = component["y"]
+        if row.version >= low:
+            versions.append(row.version)
+            timestamps.append(row.created_at)
+            positions.append(current[:, :len(names)].copy())
+
+    x = np.full((len(versions), len(names)), np.nan)
+    y = np.full((len(versions), len(names)), np.nan)
+    for i, position in enumerate(positions):
+        x[i, :position.shape[1]] = position[0]
+        y[i, :position.shape[1]] = position[1]
+    return {
+        "versions": np.array(versions, dtype=np.int64),
+        "timestamps": timestamps,
+        "component_ids": list(columns),
+        "names": names,
+        "x": x,
+        "y": y
+    }
+
+def derivatives(versions: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Change per version of each column of ``values``, and the change of that.
+
+    The first row of velocity and first two of acceleration are NaN, as is
+    anything next to a version where the component is absent.
+    """
+    steps = np.diff(versions).astype(float)[:, np.newaxis]
+    velocity = np.full_like(values, np.nan)
+    velocity[1:] = np.diff(values, axis=0) / steps
+    acceleration = np.full_like(values, np.nan)
+    acceleration[1:] = np.diff(velocity, axis=0) / steps
+    return velocity, acceleration
+
+@instrumentation.timed("versions.trajectory")
+def load_trajectories(
+    db: Session,
+    map_id: int,
+    low: int,
+    high: int,
+    component_ids: Optional[Collection[str]] = None
+) -> Optional[Dict]:
+    """Replay versions ``low`` to ``high`` of a map; None if there are none."""
+    query = version_store.version_chain(db, map_id, low, high, MapVersionDB.created_at)
+    if query is None:
+        return None
+    return replay_positions(query.yield_per(TRAJECTORY_FETCH_SIZE), low, component_ids)
+
+def component_trajectory(series: Dict, component_id: str) -> Optional[Dict]:
+    """Columnar trajectory of one component over the versions it is part of."""
+    if component_id not in series["component_ids"]:
+        return None
+    column = series["component_ids"].index(component_id)
+    present = ~np.isnan(series["x"][:, column])
+    versions = series["versions"][present]
+    x = series["x"][present, column]
+    velocity, acceleration = derivatives(versions, x[:, np.newaxis])
+    return {
+        "component_id": component_id,
+        "name": series["names"][column],
+        "versions": versions,
+        "timestamps": [t for t, keep in zip(series["timestamps"], present) if keep],
+        "x": x,
+        "y": series["y"][present, column],
+        "evolution_velocity": velocity[:, 0],
+        "evolution_acceleration": acceleration[:, 0]
+    }
+
+def all_trajectories(series: Dict) -> Dict:
+    """Columnar trajectories of every component, aligned on the shared version axis."""
+    with instrumentation.stage("versions.trajectory_derivatives"):
+        velocity, acceleration = derivatives(series["versions"], series["x"])
+        # Transposed copies so each component's series is a contiguous row
+        x, y, velocity, acceleration = (
+            np.ascontiguousarray(values.T) for values in (series["x"], series["y"], velocity, acceleration)
+        )
+    return {
+        "versions": series["versions"],
+        "timestamps": series["timestamps"],
+        "components": [
+            {
+                "component_id": component_id,
+                "name": series["names"][column],
+                "x": x[column],
+                "y": y[column],
+                "evolution_velocity": velocity[column],
+                "evolution_acceleration": acceleration[column]
+            }
+            for column, component_id in enumerate(series["component_ids"])
+        ]
+    }
@@ -0,0 +1,362 @@
+import math
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, update
+from sqlalchemy.orm import Query, Session
+from models import MapDB, MapVersionDB
+import component_index
+
+# Versions are stored as a full snapshot every SNAPSHOT_INTERVAL versions and as
+# deltas against the previous version in between, so reads replay at most
+# SNAPSHOT_INTERVAL - 1 deltas.
+SNAPSHOT_INTERVAL = int(os.getenv("VERSION_SNAPSHOT_INTERVAL", "20"))
+
+# Store a snapshot instead when a delta touches more than this share of the map
+MAX_DELTA_RATIO = 0.5
+
+# The latest version written to each recently saved map, so the next save can
+# delta-encode without a read. Bounded by the components and relationships held,
+# since maps range from a handful to many thousands of each.
+CONTENT_CACHE_ITEMS = int(os.getenv("VERSION_CONTENT_CACHE_ITEMS", "200000"))
+
+Content = Tuple[List[Dict], List[Dict]]
+
+# map id -> (version number, content), least recently saved first
+_recent_content: "OrderedDict[int, Tuple[int, Content]]" = OrderedDict()
+_recent_content_items = 0
+_recent_content_lock = threading.Lock()
+
+def _content_items(content: Content) -> int:
+    return 1 + len(content[0]) + len(content[1])
+
+def _remember_content(map_id: int, version_num: int, content: Content) -> None:
+    global _recent_content_items
+    items = _content_items(content)
+    with _recent_content_lock:
+        replaced = _recent_content.pop(map_id, None)
+        if replaced is not None:
+            _recent_content_items -= _content_items(replaced[1])
+        if items > CONTENT_CACHE_ITEMS:
+            return
+        _recent_content[map_id] = (version_num, content)
+        _recent_content_items += items
+        while _recent_content_items > CONTENT_CACHE_ITEMS:
+            _, (_, evicted) = _recent_content.popitem(last=False)
+            _recent_content_items -= _content_items(evicted)
+
+def _recall_content(map_id: int, version_num: int) -> Optional[Content]:
+    with _recent_content_lock:
+        entry = _recent_content.get(map_id)
+    if entry is None or entry[0] != version_num:
+        return None
+    return entry[1]
+
+def _edge_key(rel: Dict) -> Tuple[str, str, str]:
+    return (rel['source'], rel['target'], rel['type'])
+
+def compute_delta(
+    old_components: List[Dict],
+    old_relationships: List[Dict],
+    new_components: List[Dict],
+    new_relationships: List[Dict]
+) -> Dict:
+    """Describe the change between two versions' content."""
+    old_by_id = {c['id']: c for c in old_components}
+    new_ids = set()
+    added = []
+    changed = []
+    for component in new_components:
+        new_ids.add(component['id'])
+        old = old_by_id.get(component['id'])
+        if old is None:
+            added.append(component)
+        elif old != component:
+            changed.append(component)
+
+    old_edges = Counter(map(_edge_key, old_relationships))
+    new_edges = Counter(map(_edge_key, new_relationships))
+    return {
+        "components": {
+            "added": added,
+            "removed": [cid for cid in old_by_id if cid not in new_ids],
+            "changed": changed
+        },
+        "relationships": {
+            "added": [list(edge) for edge in (new_edges - old_edges).elements()],
+            "removed": [list(edge) for edge in (old_edges - new_edges).elements()]
+        }
+    }
+
+def apply_delta(components: List[Dict], relationships: List[Dict], delta: Dict) -> Content:
+    """Rebuild a version's content from its predecessor's content and its delta."""
+    comp_delta = delta["components"]
+    removed = set(comp_delta["removed"])
+    changed = {c['id']: c for c in comp_delta["changed"]}
+    new_components = [changed.get(c['id'], c) for c in components if c['id'] not in removed]
+    new_components.extend(comp_delta["added"])
+
+    to_remove = Counter(tuple(edge) for edge in delta["relationships"]["removed"])
+    new_relationships = []
+    for rel in relationships:
+        key = _edge_key(rel)
+        if to_remove[key]:
+            to_remove[key] -= 1
+            continue
+        new_relationships.append(rel)
+    new_relationships.extend(
+        {'source': source, 'target': target, 'type': rel_type}
+        for source, target, rel_type in delta["relationships"]["added"]
+    )
+    return new_components, new_relationships
+
+def is_snapshot_due(version_num: int) -> bool:
+    return (version_num - 1) % SNAPSHOT_INTERVAL == 0
+
+def delta_is_large(delta: Dict, components: List[Dict], relationships: List[Dict]) -> bool:
+    """Whether a delta is big enough that a snapshot is the better encoding."""
+    comp_delta = delta["components"]
+    rel_delta = delta["relationships"]
+    touched = (
+        len(comp_delta["added"]) + len(comp_delta["removed"]) + len(comp_delta["changed"])
+        + len(rel_delta["added"]) + len(rel_delta["removed"])
+    )
+    return touched > MAX_DELTA_RATIO * max(len(components) + len(relationships), 1)
+
+def has_unique_ids(components: List[Dict]) -> bool:
+    """Whether no two components share an id; deltas match components by id."""
+    ids = set()
+    for component in components:
+        if component['id'] in ids:
+            return False
+        ids.add(component['id'])
+    return True
+
+def can_encode_delta(previous: Content, components: List[Dict]) -> bool:
+    """Whether a delta between the two versions would replay to the same content."""
+    return has_unique_ids(previous[0]) and has_unique_ids(components)
+
+def version_values(
+    map_id: int,
+    version_num: int,
+    components: List[Dict],
+    relationships: List[Dict],
+    previous: Optional[Content] = None,
+    **fields
+) -> Dict:
+    """Column values of a version row, delta-encoded against ``previous`` when worthwhile."""
+    values = {
+        "map_id": map_id,
+        "version": version_num,
+        "component_count": len(components),
+        "relationship_count": len(relationships),
+        **fields
+    }
+    if previous is not None and not is_snapshot_due(version_num) and can_encode_delta(previous, components):
+        delta = compute_delta(*previous, components, relationships)
+        if not delta_is_large(delta, components, relationships):
+            values["delta"] = delta
+            return values
+    values["components"] = components
+    values["relationships"] = relationships
+    return values
+
+def build_version(
+    map_id: int,
+    version_num: int,
+    components: List[Dict],
+    relationships: List[Dict],
+    previous: Optional[Content] = None,
+    **fields
+) -> MapVersionDB:
+    """Create a version row, delta-encoded against ``previous`` when worthwhile."""
+    return MapVersionDB(**version_values(map_id, version_num, components, relationships, previous, **fields))
+
+def create_version(
+    db: Session,
+    map_id: int,
+    components: List[Dict],
+    relationships: List[Dict],
+    comment: Optional[str] = None,
+    **fields
+) -> Optional[Dict]:
+    """Append a version to a map in a single transaction.
+
+    The version number comes from an atomic increment of maps.latest_version,
+    which also row-locks the map until commit. Concurrent saves to one map
+    are therefore serialized and always get distinct, gap-free numbers, and
+    the predecessor read for delta encoding is stable. Returns None if the
+    map does not exist.
+
+    This is one transaction but not one round trip: the increment, the
+    predecessor read (skipped when it is still cached from the previous
+    save), the insert and the component index updates are separate
+    statements. The delta and index rows depend on the predecessor, which
+    is only known to be current once the increment holds the row lock, so
+    they cannot be folded into the increment.
+    """
+    version_num = db.execute(
+        update(MapDB)
+        .where(MapDB.id == map_id)
+        .values(latest_version=MapDB.latest_version + 1, updated_at=datetime.utcnow())
+        .returning(MapDB.latest_version)
+    ).scalar()
+    if version_num is None:
+        db.rollback()
+        return None
+
+    # Needed for the component index even when this version is a snapshot
+    previous = None
+    if version_num > 1:
+        previous = _recall_content(map_id, version_num - 1) or load_content(db, map_id, version_num - 1)
+    content = (components, relationships)
+    row = build_version(
+        map_id,
+        version_num,
+        components,
+        relationships,
+        None if is_snapshot_due(version_num) else previous,
+        comment=comment or f"Version {version_num}",
+        created_at=datetime.utcnow(),
+        **fields
+    )
+    db.add(row)
+    component_index.record_version(db, map_id, version_num, previous, content)
+    db.flush()
+    # Serialize before commit so expired attributes are not reloaded afterwards
+    result = serialize_version(row, content)
+    db.commit()
+    _remember_content(map_id, version_num, content)
+    return result
+
+def load_content(db: Session, map_id: int, version_num: int) -> Optional[Content]:
+    """Reconstruct a version's components and relationships."""
+    return load_content_range(db, map_id, version_num, version_num).get(version_num)
+
+def load_content_range(db: Session, map_id: int, low: int, high: int) -> Dict[int, Content]:
+    """Reconstruct the content of every version from ``low`` to ``high`` inclusive."""
+    query = version_chain(db, map_id, low, high)
+    if query is None:
+        return {}
+
+    rows = query.all()
+    return {
+        row.version: content
+        for row, content in zip(rows, iter_contents(rows))
+        if row.version >= low
+    }
+
+def version_chain(db: Session, map_id: int, low: int, high: int, *columns) -> Optional[Query]:
+    """Rows needed to replay versions ``low`` to ``high``, from the snapshot at or before ``low``.
+
+    The query selects version, components, relationships and delta plus any
+    extra ``columns``, in ascending version order. None if no version up to
+    ``low`` exists.
+    """
+    snapshot = db.query(func.max(MapVersionDB.version))\
+        .filter(
+            MapVersionDB.map_id == map_id,
+            MapVersionDB.version <= low,
+            MapVersionDB.delta.is_(None)
+        )\
+        .scalar()
+    if snapshot is None:
+        return None
+
+    return db.query(
+        MapVersionDB.version,
+        MapVersionDB.components,
+        MapVersionDB.relationships,
+        MapVersionDB.delta,
+        *columns
+    )\
+        .filter(
+            MapVersionDB.map_id == map_id,
+            MapVersionDB.version >= snapshot,
+            MapVersionDB.version <= high
+        )\
+        .order_by(MapVersionDB.version)
+
+def iter_contents(rows: Iterable) -> Iterable[Content]:
+    """Yield each row's content, replaying deltas over rows in ascending version order.
+
+    The first row must be a snapshot.
+    """
+    content = None
+    for row in rows:
+        if row.delta is None:
+            content = (row.components or [], row.relationships or [])
+        else:
+            content = apply_delta(*content, row.delta)
+        yield content
+
+def diff_content(old: Content, new: Content) -> Dict:
+    """Component and relationship changes from ``old`` to ``new``.
+
+    Components are matched by id and relationships by (source, target, type)
+    through dict and Counter lookups, so the cost is linear in map size.
+    """
+    old_by_id = {c['id']: c for c in old[0]}
+    new_by_id = {c['id']: c for c in new[0]}
+    added = []
+    moved = []
+    changed = []
+    for cid, component in new_by_id.items():
+        before = old_by_id.get(cid)
+        if before is None:
+            added.append(component)
+            continue
+        dx = component['x'] - before['x']
+        dy = component['y'] - before['y']
+        if dx or dy:
+            moved.append({
+                "id": cid,
+                "name": component['name'],
+                "from": {"x": before['x'], "y": before['y']},
+                "to": {"x": component['x'], "y": component['y']},
+                "dx": dx,
+                "dy": dy,
+                "distance": math.hypot(dx, dy)
+            })
+        if {**before, 'x': 0, 'y': 0} != {**component, 'x': 0, 'y': 0}:
+            changed.append({"id": cid, "before": before, "after": component})
+
+    old_edges = Counter(map(_edge_key, old[1]))
+    new_edges = Counter(map(_edge_key, new[1]))
+    return {
+        "components": {
+            "added": added,
+            "removed": [c for cid, c in old_by_id.items() if cid not in new_by_id],
+            "moved": moved,
+            "changed": changed
+        },
+        "relationships": {
+            "added": [
+                {'source': source, 'target': target, 'type': rel_type}
+                for source, target, rel_type in (new_edges - old_edges).elements()
+            ],
+            "removed": [
+                {'source': source, 'target': target, 'type': rel_type}
+                for source, target, rel_type in (old_edges - new_edges).elements()
+            ]
+        }
+    }
+
+def serialize_version(row: MapVersionDB, content: Content) -> Dict:
+    """API representation of a version with its reconstructed content."""
+    components, relationships = content
+    return {
+        "id": row.id,
+        "map_id": row.map_id,
+        "version": row.version,
+        "components": components,
+        "relationships": relationships,
+        "component_count": len(components),
+        "relationship_count": len(relationships),
+        "content_hash": row.content_hash,
+        "analysis": row.analysis,
+        "created_at": row.created_at,
+        "comment": row.comment
+    }
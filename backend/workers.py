@@ -0,0 +1,145 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import anyio.to_thread
+import instrumentation
+import text_processor
+
+# CPU-bound work (NLP extraction, graph analysis) runs in a process pool;
+# blocking DB endpoints run in the AnyIO thread pool that FastAPI uses for `def` routes.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+CPU_QUEUE_SIZE = int(os.getenv("CPU_QUEUE_SIZE", "32"))
+DB_THREADS = int(os.getenv("DB_THREADS", "40"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "2"))
+# How long a worker's warm-up check waits for every other worker to take theirs
+WARM_UP_TIMEOUT = float(os.getenv("WARM_UP_TIMEOUT", "120"))
+
+class PoolSaturated(Exception):
+    """Raised when the CPU pool already has a full queue of pending work."""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__("CPU worker pool is saturated")
+        self.retry_after = retry_after
+
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+_rejected = 0
+_ready = False
+# Set in each worker process by _init_worker
+_warm_up_barrier = None
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        # Spawn rather than fork: the parent runs threads, and workers load their own model
+        context = multiprocessing.get_context("spawn")
+        _cpu_pool = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(context.Barrier(CPU_WORKERS),)
+        )
+    return _cpu_pool
+
+def _init_worker(barrier) -> None:
+    """Pool initializer: load the NLP model and keep the pool's warm-up barrier."""
+    global _warm_up_barrier
+    _warm_up_barrier = barrier
+    text_processor.warm_up()
+
+def _check_worker() -> Tuple[int, bool]:
+    """The worker's pid and whether its model is warm.
+
+    Waits until every worker has taken a check, so a worker cannot answer
+    the checks meant for the others.
+    """
+    try:
+        _warm_up_barrier.wait(WARM_UP_TIMEOUT)
+    except threading.BrokenBarrierError:
+        return os.getpid(), False
+    return os.getpid(), text_processor.is_ready()
+
+def start() -> None:
+    """Create the worker pools. Must be called from the event loop."""
+    _get_cpu_pool()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = DB_THREADS
+
+def shutdown() -> None:
+    """Stop the CPU pool, waiting for running work to finish."""
+    global _cpu_pool, _ready
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=True, cancel_futures=True)
+        _cpu_pool = None
+    _ready = False
+
+async def warm_up() -> None:
+    """Start every CPU worker and wait until each has a warm NLP model."""
+    global _ready
+    loop = asyncio.get_running_loop()
+    pool = _get_cpu_pool()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, _check_worker) for _ in range(CPU_WORKERS)
+    ))
+    _ready = len({pid for pid, _ in results}) == CPU_WORKERS and all(ready for _, ready in results)
+
+def is_ready() -> bool:
+    """Whether the CPU workers have finished warming up."""
+    return _ready
+
+def _release() -> None:
+    global _in_flight
+    _in_flight -= 1
+
+def _release_from(loop: asyncio.AbstractEventLoop) -> Callable:
+    """Done callback for a pool future; runs in a pool thread, so hops to the loop."""
+    def callback(_future) -> None:
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(_release)
+    return callback
+
+async def run_cpu(fn: Callable, *args: Any) -> Any:
+    """Run a picklable function in the CPU pool.
+
+    Raises PoolSaturated instead of queueing once CPU_QUEUE_SIZE calls are
+    already waiting for a free worker.
+    """
+    global _in_flight, _rejected
+    if _in_flight >= CPU_WORKERS + CPU_QUEUE_SIZE:
+        _rejected += 1
+        raise PoolSaturated()
+    loop = asyncio.get_running_loop()
+    pool_future = _get_cpu_pool().submit(
+        instrumentation.run_instrumented, fn, instrumentation.profiling_workers(), *args
+    )
+    _in_flight += 1
+    # Count the work until the pool is done with it, even if the awaiting request
+    # goes away: cancelling the asyncio wrapper does not stop a running task
+    pool_future.add_done_callback(_release_from(loop))
+    future = asyncio.wrap_future(pool_future)
+    result, timings, profile = await future
+    # Stage timings and any profile come back from the worker with the result
+    instrumentation.collect(timings, profile)
+    return result
+
+def stats() -> Dict:
+    """Queue depth and saturation of the CPU and DB pools."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "cpu_pool": {
+            "workers": CPU_WORKERS,
+            "in_flight": _in_flight,
+            "queue_depth": max(0, _in_flight - CPU_WORKERS),
+            "queue_capacity": CPU_QUEUE_SIZE,
+            "saturation": min(_in_flight / CPU_WORKERS, 1.0),
+            "rejected": _rejected
+        },
+        "db_pool": {
+            "threads": limiter.total_tokens,
+            "in_use": limiter.borrowed_tokens,
+            "queue_depth": limiter.statistics().tasks_waiting,
+            "saturation": limiter.borrowed_tokens / limiter.total_tokens
+        }
+    }
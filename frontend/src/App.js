@@ -170,7 +170,7 @@ function App() {
   const loadVersions = async (mapId) => {
     try {
       const response = await axios.get(`${API_URL}/maps/${mapId}/versions`);
-      setVersions(response.data);
+      setVersions(response.data.versions);
     } catch (error) {
       handleErrorNotification(error, 'Error loading versions. Please try again.');
     }
@@ -198,10 +198,17 @@ function App() {
     }
   };
 
-  // Handle compare
-  const handleCompare = (version) => {
-    setCompareVersion(version);
-    setShowComparison(true);
+  // Handle compare (the version list only carries metadata, so fetch the full version)
+  const handleCompare = async (version) => {
+    try {
+      const response = await axios.get(
+        `${API_URL}/maps/${currentMapId}/versions/${version.version}`
+      );
+      setCompareVersion(response.data);
+      setShowComparison(true);
+    } catch (error) {
+      handleErrorNotification(error, 'Error loading version for comparison.');
+    }
   };
 
   // Create new map